@@ -1,68 +1,283 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from formal_exec.path_to_predicate import *
 from formal_exec.predicate_solve import *
 from model.cfg import *
 from tests.tests import *
+from tests.minimize import *
+
+
+def iter_paths_through(cfg, max_loop, u, targets):
+    """
+    Yields paths from START to u followed by a path from u to one of targets, with at most max_loop loops for each
+    'While' in both parts
+    """
+    for v in targets:
+        for path1 in iter_paths_with_limited_loop(cfg, max_loop, 'START', u):
+            for path2 in iter_paths_with_limited_loop(cfg, max_loop, u, v):
+                yield path1 + path2[1:]
+
+
+def iter_paths_to(cfg, max_loop, u, path2):
+    """
+    Yields paths from START to u, with at most max_loop loops for each 'While', followed by path2 starting from u
+    """
+    for path1 in iter_paths_with_limited_loop(cfg, max_loop, 'START', u):
+        yield path1 + path2[1:]
+
+
+def iter_feasible_paths(cfg, max_loop, u, v, feasible, state=None):
+    """
+    Yields (path, state) for the paths from u to v with at most max_loop loops for each 'While', in the order of
+    iter_paths_with_limited_loop, state being the SymbolicState at the end of path
+    Paths are executed symbolically as they are explored, each edge of the tree of the paths once. After each decision,
+    feasible(state) tells whether the conditions met so far can hold: if not, no path extending this prefix is explored.
+    Each path yielded is a new list of labels, so yielding them costs the sum of their lengths.
+    :param cfg:
+    :param max_loop:
+    :param u:
+    :param v:
+    :param feasible:
+    :param state: state at u, initial_state(cfg) if None
+    :return:
+    """
+    compact = compact_cfg(cfg)
+    forest = loop_forest(cfg)
+    labels = compact.labels
+    start, end = compact.index[u], compact.index.get(v)
+    prefix = [start]
+    states = [initial_state(cfg) if state is None else state]
+    counters = [(0,) * len(forest)]
+    next_edges = [compact.offsets[start]]
+    if start == end:
+        yield compact.to_labels(prefix), states[-1]
+    while next_edges:
+        e = next_edges[-1]
+        if e == compact.offsets[prefix[-1] + 1]:
+            next_edges.pop()
+            counters.pop()
+            states.pop()
+            prefix.pop()
+            continue
+        next_edges[-1] = e + 1
+        counts = forest.count_iterations(counters[-1], e)
+        increment = forest.edge_increments[e]
+        if increment >= 0 and counts[increment] > max_loop:
+            continue
+        w = compact.targets[e]
+        state = states[-1].follow(cfg[labels[prefix[-1]]][labels[w]])
+        if compact.true_edge[prefix[-1]] >= 0 and not feasible(state):
+            continue
+        prefix.append(w)
+        states.append(state)
+        counters.append(counts)
+        next_edges.append(compact.offsets[w])
+        if w == end:
+            yield compact.to_labels(prefix), state
+
+
+def iter_feasible_paths_through(cfg, max_loop, u, targets, feasible):
+    """
+    Yields the paths of iter_paths_through whose prefixes are all feasible, checked after each decision
+    """
+    for v in targets:
+        for path1, state1 in iter_feasible_paths(cfg, max_loop, 'START', u, feasible):
+            for path2, state2 in iter_feasible_paths(cfg, max_loop, u, v, feasible, state1):
+                yield path1 + path2[1:]
+
+
+def iter_feasible_paths_to(cfg, max_loop, u, path2, feasible):
+    """
+    Yields the paths of iter_paths_to whose prefixes are all feasible, checked after each decision
+    """
+    for path1, state in iter_feasible_paths(cfg, max_loop, 'START', u, feasible):
+        for j in range(1, len(path2)):
+            state = state.follow(cfg[path2[j - 1]][path2[j]])
+            if len(cfg[path2[j - 1]]) == 2 and not feasible(state):
+                break
+        else:
+            yield path1 + path2[1:]
+
+
+def _first_solution(key):
+    vars, constraints, min_range, max_range = key
+    return first_solution(vars, constraints, min_range, max_range)
+
+
+def solve_in_pool(obligations, solver_cache, workers, paths_in_flight=2):
+    """
+    Solves obligations in a pool of worker processes, giving for each of them the solution of its first satisfiable
+    problem, None if there is none, as solving them in turn would.
+    Problems of all obligations are solved at the same time, at most paths_in_flight per obligation and two per worker.
+    Once problem j of an obligation has a solution, its problems after j are no longer submitted and those waiting are
+    cancelled, the solution being kept once all the problems before j are known to have none.
+    :param obligations: list of iterators over the problems (vars, constraints) of each obligation, one per path,
+    constraints being terms or strings
+    :param solver_cache: SolverCache, checked before submitting a problem and filled with the results
+    :param workers: number of worker processes
+    :param paths_in_flight:
+    :return:
+    """
+    solutions = [None] * len(obligations)
+    # Number of the next problem of each obligation, None once its problems are all submitted or no longer needed
+    next_problem = [0] * len(obligations)
+    # Number of its first problem found satisfiable
+    best = [None] * len(obligations)
+    # Problems of each obligation being solved, by number
+    pending = [{} for _ in obligations]
+    futures = {}
+
+    def resolve(o, j, key):
+        solution = solver_cache.get(key)
+        if solution is not None and (best[o] is None or j < best[o]):
+            best[o] = j
+            solutions[o] = solution
+            next_problem[o] = None
+            for i in [i for i in pending[o] if i > j]:
+                if pending[o][i].cancel():
+                    del futures[pending[o].pop(i)]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            for o, problems in enumerate(obligations):
+                while next_problem[o] is not None and len(pending[o]) < paths_in_flight and \
+                        len(futures) < 2 * workers:
+                    problem = next(problems, None)
+                    if problem is None:
+                        next_problem[o] = None
+                        break
+                    j = next_problem[o]
+                    next_problem[o] += 1
+                    key = solver_cache.key(*problem)
+                    if key in solver_cache:
+                        resolve(o, j, key)
+                    else:
+                        future = executor.submit(_first_solution, key)
+                        pending[o][j] = future
+                        futures[future] = (o, j, key)
+            if not futures:
+                break
+            done, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+            for future in done:
+                o, j, key = futures.pop(future)
+                del pending[o][j]
+                solver_cache.results[key] = future.result()
+                resolve(o, j, key)
+    return solutions
 
 
 class TestGenerator:
     def __init__(self, prog):
         self.prog = prog
-        self.cfg = ast_to_cfg_with_end(copy.deepcopy(prog))
-        self.test = Test([])
+        self.cfg = get_cfg(prog)
+        # Criterion the tests are generated for, set by each generator
+        self.test = None
+        self.solver_cache = SolverCache()
+        # Number of worker processes solving obligations, which are solved in the current process if None
+        self.workers = None
+        # Whether paths are explored symbolically, leaving out those whose prefix already is infeasible
+        self.prune = False
+        # Number of prefixes found infeasible while exploring for the last findTests, none of their extensions being
+        # explored: the paths left out below them are not counted
+        self.pruned = 0
+
+    def feasible(self, state):
+        """
+        Tells whether the constraints of a SymbolicState can hold, counting the prefixes pruned
+        """
+        if self.solver_cache.solve(set(state.valuation), state.constraint_terms()) is not None:
+            return True
+        self.pruned += 1
+        return False
+
+    def pathsWithLimitedLoop(self, max_loop, u, v):
+        """
+        Paths from u to v with at most max_loop loops for each 'While', only the feasible ones if prune is set
+        """
+        if self.prune:
+            return (path for path, state in iter_feasible_paths(self.cfg, max_loop, u, v, self.feasible))
+        return iter_paths_with_limited_loop(self.cfg, max_loop, u, v)
+
+    def pathsThrough(self, max_loop, u, targets):
+        if self.prune:
+            return iter_feasible_paths_through(self.cfg, max_loop, u, targets, self.feasible)
+        return iter_paths_through(self.cfg, max_loop, u, targets)
+
+    def pathsTo(self, max_loop, u, path2):
+        if self.prune:
+            return iter_feasible_paths_to(self.cfg, max_loop, u, path2, self.feasible)
+        return iter_paths_to(self.cfg, max_loop, u, path2)
 
     def findPaths(self):
         return {}
 
+    def pathProblems(self, possible_path):
+        """
+        Yields the problem (vars, constraints) to solve for each path, constraints being terms
+        """
+        for path, state in iter_path_predicates(self.cfg, possible_path):
+            yield set(state.valuation), state.constraint_terms()
+
+    def solveObligations(self, obligations):
+        """
+        Searches a solution for each coverage condition, among the problems given for it
+        :param obligations: dictionary giving for each coverage condition an iterator over its problems, only consumed
+        until a solution is found
+        :return: list of the solutions found, and whether there is one for each condition
+        """
+        tests = []
+        full_test = True
+        if self.workers:
+            solutions = solve_in_pool(list(obligations.values()), self.solver_cache, self.workers)
+        else:
+            solutions = []
+            for problems in obligations.values():
+                solution = None
+                for vars, constraints in problems:
+                    solution = self.solver_cache.solve(vars, constraints)
+                    if solution is not None:
+                        break
+                solutions.append(solution)
+        for cover_name, solution in zip(obligations, solutions):
+            if solution is not None:
+                tests.append(solution)
+            else:
+                print(f'WARNING: No solution found for any path given for coverage condition {cover_name}')
+                full_test = False
+        if self.prune:
+            print(f"{self.pruned} infeasible prefixes pruned")
+        return tests, full_test
+
     def findTests(self, paths=None):
         """
         For each coverage condition given in find path, search for a solution for at least on of the paths given for
         this condition.
+        Paths may be given as iterators, which are only consumed until a solution is found.
         """
-        tests = []
-        full_test = True
+        self.pruned = 0
         if paths is None:
             paths = self.findPaths()
-        for cover_name, possible_path in paths.items():
-            solution_found = False
-            for path in possible_path:
-                vars, constraints = path_predicate(self.cfg, path)
-                vars = {k for k, v in vars.items()}
-                ps = PredicateSolver(vars, constraints)
-                ps.add_constraints()
-                solutions = ps.problem.getSolutions()
-                if len(solutions) > 0:
-                    tests.append(solutions[0])
-                    solution_found = True
-                    break
-            if not solution_found:
-                print(f'WARNING: No solution found for any path given for coverage condition {cover_name}')
-                full_test = False
+        tests, full_test = self.solveObligations({cover_name: self.pathProblems(possible_path)
+                                                  for cover_name, possible_path in paths.items()})
         self.test.print_missing = True
         self.test.data = copy.deepcopy(tests)
         self.test.runTests(copy.deepcopy(self.prog))
         self.test.print_missing = False
         return tests, full_test
 
-    def findReducedTests(self):
+    def findReducedTests(self, exact=False):
+        """
+        Picks among the valuations found by findTests a suite reaching the coverage of all of them
+        :param exact: if True, the suite is a smallest one, otherwise it is built greedily, picking the valuation
+        covering the most new obligations, the first one found in case of a tie
+        :return:
+        """
         test_valuation, is_full_test = self.findTests()
-        self.test.data = copy.deepcopy(test_valuation)
-        max_score = self.test.runTests(copy.deepcopy(self.prog))
-        current_score = 0
-        minimum_test = []
-        remaining_valuations = copy.deepcopy(test_valuation)
-        while current_score < max_score:
-            best_valuation = None
-            best_score = 0
-            for valuation in remaining_valuations:
-                self.test.data = copy.deepcopy(minimum_test) + [copy.deepcopy(valuation)]
-                score = self.test.runTests(copy.deepcopy(self.prog))
-                if score > best_score:
-                    best_score = score
-                    best_valuation = copy.deepcopy(valuation)
-            minimum_test.append(best_valuation)
-            remaining_valuations = [valuation for valuation in remaining_valuations if valuation != best_valuation]
-            current_score = best_score
-        print(f"Test found for a coverage of {int(current_score*100)/100}%")
+        coverage = IncrementalCoverage(self.test, copy.deepcopy(self.prog))
+        masks = [coverage.mask(valuation) for valuation in test_valuation]
+        minimum_test = [test_valuation[j] for j in minimize(masks, exact=exact)]
+        for valuation in minimum_test:
+            coverage.add(valuation)
+        print(f"Test found for a coverage of {int(coverage.score()*100)/100}%")
         return minimum_test
 
 
@@ -76,9 +291,7 @@ class TestTAGenerator(TestGenerator):
         assign_labels = get_assigns(self.cfg)
         paths = {}
         for label in assign_labels:
-            paths[f'<Assign {label}>'] = []
-            for path in get_paths_with_limited_loop(self.cfg, self.max_loop, 'START', label):
-                paths[f'<Assign {label}>'].append(path)
+            paths[f'<Assign {label}>'] = self.pathsWithLimitedLoop(self.max_loop, 'START', label)
         return paths
 
 
@@ -93,12 +306,8 @@ class TestTDGenerator(TestGenerator):
         paths = {}
         for label in decision_labels:
             neighbors = list(self.cfg.neighbors(label))
-            paths[f'<Decision {label} True>'] = []
-            for path in get_paths_with_limited_loop(self.cfg, self.max_loop, 'START', neighbors[0]):
-                paths[f'<Decision {label} True>'].append(path)
-            paths[f'<Decision {label} False>'] = []
-            for path in get_paths_with_limited_loop(self.cfg, self.max_loop, 'START', neighbors[1]):
-                paths[f'<Decision {label} False>'].append(path)
+            paths[f'<Decision {label} True>'] = self.pathsWithLimitedLoop(self.max_loop, 'START', neighbors[0])
+            paths[f'<Decision {label} False>'] = self.pathsWithLimitedLoop(self.max_loop, 'START', neighbors[1])
         return paths
 
 
@@ -147,12 +356,8 @@ class TestTDefGenerator(TestGenerator):
                     ref_by_def[pair[0]].append(pair[1])
                 else:
                     ref_by_def[pair[0]] = [pair[1]]
-                for def_label in ref_by_def:
-                    paths[f'<Def {def_label}>'] = []
-                    for ref_label in ref_by_def[def_label]:
-                        for path1 in get_paths_with_limited_loop(self.cfg, self.max_loop, 'START', def_label):
-                            for path2 in get_paths_with_limited_loop(self.cfg, self.max_loop, def_label, ref_label):
-                                paths[f'<Def {def_label}>'].append(path1 + path2[1:])
+        for def_label in ref_by_def:
+            paths[f'<Def {def_label}>'] = self.pathsThrough(self.max_loop, def_label, ref_by_def[def_label])
         # Add empty path list for def without ref
         all_def = get_assigns(self.cfg)
         for label in all_def:
@@ -173,10 +378,7 @@ class TestTUGenerator(TestGenerator):
         for variable in var_list:
             pairs = all_uses(self.cfg, variable)
             for pair in pairs:
-                paths[f'<Ref {pair[1]} for Def {pair[0]}>'] = []
-                for path1 in get_paths_with_limited_loop(self.cfg, self.max_loop, 'START', pair[0]):
-                    for path2 in get_paths_with_limited_loop(self.cfg, self.max_loop, pair[0], pair[1]):
-                        paths[f'<Ref {pair[1]} for Def {pair[0]}>'].append(path1 + path2[1:])
+                paths[f'<Ref {pair[1]} for Def {pair[0]}>'] = self.pathsThrough(self.max_loop, pair[0], [pair[1]])
         return paths
 
 
@@ -194,12 +396,10 @@ class TestDUGenerator(TestGenerator):
             for pair in pairs:
                 # Between the two labels of the pair, we only allow simple paths, and each simple path has its own entry
                 # in the paths dictionary.
-                for path2 in get_paths_with_limited_loop(self.cfg, 1, pair[0], pair[1]):
-                    paths[f'<Ref {pair[1]} for Def {pair[0]} - path {path2}>'] = []
+                for path2 in iter_paths_with_limited_loop(self.cfg, 1, pair[0], pair[1]):
                     # Before the first label of the pair, we allow max_loop loops to get all possible way to reach the
                     # simple path.
-                    for path1 in get_paths_with_limited_loop(self.cfg, self.max_loop, 'START', pair[0]):
-                        paths[f'<Ref {pair[1]} for Def {pair[0]} - path {path2}>'].append(path1 + path2[1:])
+                    paths[f'<Ref {pair[1]} for Def {pair[0]} - path {path2}>'] = self.pathsTo(self.max_loop, pair[0], path2)
         return paths
 
 
@@ -214,85 +414,91 @@ class TestTCGenerator(TestGenerator):
         self.conditions = get_all_conditions(self.cfg)
         paths = {}
         for label in self.conditions.keys():
-            paths[f'<Conditions {label}>'] = get_paths_with_limited_loop(self.cfg, self.max_loop, 'START', label)
+            paths[f'<Conditions {label}>'] = list(self.pathsWithLimitedLoop(self.max_loop, 'START', label))
         return paths
 
+    def conditionProblems(self, possible_path, condition):
+        """
+        Yields the problem to solve for each path, condition having to hold at its end
+        """
+        for path, state in iter_path_predicates(self.cfg, possible_path):
+            constraints = state.constraint_terms()
+            constraints.add(term_of(condition, state.valuation))
+            yield set(state.valuation), constraints
+
     def findTests(self, paths=None):
-        tests = []
-        full_test = True
+        self.pruned = 0
         if paths is None:
             paths = self.findPaths()
+        obligations = {}
         for label in self.conditions:
             for condition in self.conditions[label]:
                 for cond_value in [True, False]:
-                    condition_string = stringify_expr(condition)
-                    if not cond_value:
-                        condition_string = stringify_expr(BooleanUnaryExp("!", condition))
-                    solution_found = False
-                    for path in paths[f'<Conditions {label}>']:
-                        vars, constraints = path_predicate(self.cfg, path)
-                        new_condition_string = condition_string
-                        for var in vars:
-                            new_condition_string = new_condition_string.replace(var, vars[var])
-                        constraints.add(new_condition_string)
-                        vars = {k for k, v in vars.items()}
-                        ps = PredicateSolver(vars, constraints)
-                        ps.add_constraints()
-                        solutions = ps.problem.getSolutions()
-                        if len(solutions) > 0:
-                            tests.append(solutions[0])
-                            solution_found = True
-                            break
-                    if not solution_found:
-                        print(f'WARNING: No solution found for any path given for coverage condition <Label {label} Condition {condition} Value {cond_value}>')
-                        full_test = False
-
-        return tests, full_test
+                    expected = condition if cond_value else BooleanUnaryExp("!", condition)
+                    obligations[f'<Label {label} Condition {condition} Value {cond_value}>'] = \
+                        self.conditionProblems(paths[f'<Conditions {label}>'], expected)
+        return self.solveObligations(obligations)
 
 
 class FullTest:
-    def __init__(self, prog, k_list, i_list, max_loop = 2):
+    def __init__(self, prog, k_list, i_list, max_loop = 2, cache_file=None, workers=None, prune=False):
+        """
+        :param cache_file: JSON file keeping the solver results between runs, kept in memory only if None
+        :param workers: number of worker processes solving obligations, None to solve them in the current process
+        :param prune: whether generators leave out paths whose prefix already is infeasible
+        """
         self.prog = prog
         self.k_list = k_list
         self.i_list = i_list
         self.max_loop = max_loop
+        self.solver_cache = SolverCache(cache_file)
+        self.workers = workers
+        self.prune = prune
 
-    def findFullTest(self):
-        tests = []
-        print("Test TA")
-        test_generator = TestTAGenerator(self.prog, self.max_loop)
-        solutionTA = test_generator.findReducedTests()
-        tests += [test for test in solutionTA if test not in tests]
-        print("Test TD")
-        test_generator = TestTDGenerator(self.prog, self.max_loop)
-        solutionTD = test_generator.findReducedTests()
-        tests += [test for test in solutionTD if test not in tests]
-        for k in self.k_list:
-            print(f"Test {k}-TC")
-            test_generator = TestkTCGenerator(self.prog, k)
-            solutionkTC = test_generator.findReducedTests()
-            tests += [test for test in solutionkTC if test not in tests]
-        for i in self.i_list:
-            print(f"Test {i}-TB")
-            test_generator = TestiTBGenerator(self.prog, i)
-            solutioniTB = test_generator.findReducedTests()
-            tests += [test for test in solutioniTB if test not in tests]
-        print("Test TDef")
-        test_generator = TestTDefGenerator(self.prog, self.max_loop)
-        solutionTDef = test_generator.findReducedTests()
-        tests += [test for test in solutionTDef if test not in tests]
-        print("Test TU")
-        test_generator = TestTUGenerator(self.prog, self.max_loop)
-        solutionTU = test_generator.findReducedTests()
-        tests += [test for test in solutionTU if test not in tests]
-        print("Test DU")
-        test_generator = TestDUGenerator(self.prog, self.max_loop)
-        solutionDU = test_generator.findReducedTests()
-        tests += [test for test in solutionDU if test not in tests]
-        print("Test TC")
-        test_generator = TestTCGenerator(self.prog, self.max_loop)
-        solutionTC = test_generator.findReducedTests()
-        tests += [test for test in solutionTC if test not in tests]
+    def generators(self):
+        """
+        Returns the test generators of every criterion
+        """
+        generators = [TestTAGenerator(self.prog, self.max_loop), TestTDGenerator(self.prog, self.max_loop)]
+        generators += [TestkTCGenerator(self.prog, k) for k in self.k_list]
+        generators += [TestiTBGenerator(self.prog, i) for i in self.i_list]
+        generators += [TestTDefGenerator(self.prog, self.max_loop), TestTUGenerator(self.prog, self.max_loop),
+                       TestDUGenerator(self.prog, self.max_loop), TestTCGenerator(self.prog, self.max_loop)]
+        # Generators share the solver results, many paths being the same for several criteria
+        for test_generator in generators:
+            test_generator.solver_cache = self.solver_cache
+            test_generator.workers = self.workers
+            test_generator.prune = self.prune
+        return generators
+
+    def findFullTest(self, exact=False):
+        """
+        Gathers the valuations found for every criterion, then picks among them a suite reaching their coverage for all
+        criteria at once: a valuation found for a criterion may cover obligations of others.
+        :param exact: if True, the suite is a smallest one, otherwise it is built greedily
+        :return:
+        """
+        candidates = []
+        coverages = []
+        for test_generator in self.generators():
+            print(f"Test {test_generator.test.name}")
+            test_valuation, is_full_test = test_generator.findTests()
+            candidates += [test for test in test_valuation if test not in candidates]
+            coverages.append(IncrementalCoverage(test_generator.test, copy.deepcopy(self.prog)))
+        # Obligations of all criteria are numbered one after the other in a single bitset
+        masks = []
+        for valuation in candidates:
+            mask, shift = 0, 0
+            for coverage in coverages:
+                mask |= coverage.mask(valuation) << shift
+                shift += len(coverage.obligations)
+            masks.append(mask)
+        tests = [candidates[j] for j in minimize(masks, exact=exact)]
+        for coverage in coverages:
+            for valuation in tests:
+                coverage.add(valuation)
+            print(f"Test {coverage.test.name} found for a coverage of {int(coverage.score()*100)/100}%")
+        self.solver_cache.save()
         return tests
 
 
@@ -1,6 +1,7 @@
 from model.cfg import *
 from model.arithmexpr import *
 from model.booleanexpr import *
+from formal_exec.terms import *
 
 def stringify_expr(expr):
     """
@@ -20,39 +21,115 @@ def exec_edge(e, valuation, constraints):
     """
     Given an edge of a control flow graph, a current valuation for variable and constraints, updates them according to
     the command found in the edge
+    Values and constraints are terms of the initial values of the variables, built by replacing variables with their
+    terms in the expressions of the edge.
     :param e: edge
-    :param valuation: current state of variables to be updated
-    :param constraints: current constraints to be updated
+    :param valuation: current state of variables to be updated, from names to terms
+    :param constraints: current constraints to be updated, set of terms
     :return:
     """
     if e['booleanexpr'] != BooleanConst(True) and e['booleanexpr'] != BooleanConst(False):
-        expr = stringify_expr(e['booleanexpr'])
-        for v in valuation:
-            expr = expr.replace(v, f"__{v}__")
-        for v in valuation:
-            expr = expr.replace(f"__{v}__", stringify_expr(valuation[v]))
-        constraints.add(expr)
+        constraints.add(term_of(e['booleanexpr'], valuation))
 
     if e['command'].typename == "Assign":
-        var = e['command'].children[0].name
-        expr = stringify_expr(e['command'].children[1])
-        for v in valuation:
-            expr = expr.replace(v, f"__{v}__")
-        for v in valuation:
-            expr = expr.replace(f"__{v}__", valuation[v])
-        valuation[var] = expr
+        name = e['command'].children[0].name
+        valuation[name] = term_of(e['command'].children[1], valuation)
 
     return valuation, constraints
 
 
 def path_predicate(cfg, path):
-    valuation = {str(x): str(x) for x in get_var(cfg)}
+    """
+    Returns the value of each variable at the end of path and the constraints the initial values must meet to follow
+    it, printed as strings for the solver
+    """
+    valuation = {str(x): var(str(x)) for x in get_var(cfg)}
     constraints = set()
     for i in range(len(path) - 1):
         u, v = path[i], path[i + 1]
         e = cfg[u][v]
         valuation, constraints = exec_edge(e, valuation, constraints)
-    return valuation, constraints
+    return {x: str(term) for x, term in valuation.items()}, {str(term) for term in constraints}
+
+
+class SymbolicState(object):
+    """
+    State of a symbolic execution after some path: valuation gives the term of each variable as a function of the
+    initial values, and constraints the conditions met so far, as a chain (term, previous chain) ending with None.
+    States are never modified, so the state of a prefix is shared by all the paths extending it.
+    """
+    __slots__ = ('valuation', 'constraints')
+
+    def __init__(self, valuation, constraints=None):
+        self.valuation = valuation
+        self.constraints = constraints
+
+    def follow(self, e):
+        """
+        Returns the state after following edge e, as exec_edge would update it
+        """
+        constraints = self.constraints
+        if e['booleanexpr'] != BooleanConst(True) and e['booleanexpr'] != BooleanConst(False):
+            constraints = (term_of(e['booleanexpr'], self.valuation), constraints)
+        valuation = self.valuation
+        if e['command'].typename == "Assign":
+            valuation = dict(valuation)
+            valuation[e['command'].children[0].name] = term_of(e['command'].children[1], self.valuation)
+        return SymbolicState(valuation, constraints)
+
+    def constraint_terms(self):
+        """
+        Returns the set of the constraint terms, which SolverCache prints only for problems it has not met yet
+        """
+        terms = set()
+        chain = self.constraints
+        while chain is not None:
+            term, chain = chain
+            terms.add(term)
+        return terms
+
+
+def initial_state(cfg):
+    """
+    Returns the SymbolicState before any edge, each variable being its own initial value
+    """
+    return SymbolicState({str(x): var(str(x)) for x in get_var(cfg)})
+
+
+def iter_path_predicates(cfg, paths):
+    """
+    Yields (path, state) for each path, state being the SymbolicState at its end, giving the same predicate as
+    path_predicate
+    Paths are executed symbolically edge by edge, keeping the state reached after each label of the last path: a path
+    only executes the edges following the prefix it shares with the one before. Paths enumerated depth first, as
+    iter_paths_with_limited_loop does, share long prefixes, so the symbolic execution follows the size of the tree of
+    the paths. Finding the shared prefix still compares each path with the one before, so the whole still costs the sum
+    of the lengths of the paths, as enumerating them does.
+    :param cfg:
+    :param paths: iterable over paths, consumed lazily
+    :return:
+    """
+    initial = initial_state(cfg)
+    labels = []
+    # states[j] is the state after labels[:j + 1]
+    states = []
+    for path in paths:
+        if not path:
+            continue
+        n = 0
+        common = min(len(path), len(labels))
+        while n < common and path[n] == labels[n]:
+            n += 1
+        if n == 0:
+            labels, states = [path[0]], [initial]
+            n = 1
+        else:
+            del labels[n:]
+            del states[n:]
+        for j in range(n, len(path)):
+            states.append(states[-1].follow(cfg[path[j - 1]][path[j]]))
+            labels.append(path[j])
+        yield path, states[-1]
 
 
 if __name__ == '__main__':
@@ -2,6 +2,11 @@ from collections import defaultdict
 from constraint import *
 from formal_exec.path_to_predicate import *
 import ast
+import json
+import os
+import re
+
+IDENTIFIER = re.compile(r'[A-Za-z_]\w*')
 
 
 class PredicateSolver(object):
@@ -11,25 +16,164 @@ class PredicateSolver(object):
         for v in vars:
             self.problem.addVariable(v, range(min_range, max_range))
         self.constraints = constraints
+        self.min_range = min_range
+        self.max_range = max_range
 
-    def add_constraint(self, constraint):
-        expr = constraint[:]
-        L = list(self.vars)
-        for i in range(len(L)):
-            expr = expr.replace(L[i], f'args[{i}]')
+    def mentioned(self, constraint):
+        """
+        Returns the sorted list of the variables constraint mentions
+        """
+        # Whole names only, a variable name may be part of another
+        return sorted({name for name in IDENTIFIER.findall(constraint) if name in self.vars})
+
+    def compile(self, constraint):
+        """
+        Compiles constraint, a Python boolean expression over the variables, once
+        :return: the variables it mentions and a function taking their values in this order
+        """
+        mentioned = self.mentioned(constraint)
+        index = {v: i for i, v in enumerate(mentioned)}
+        expr = IDENTIFIER.sub(lambda m: f'_{index[m.group()]}' if m.group() in index else m.group(), constraint)
         expr = expr.replace("!", 'not').replace("not=", "!=")
 
         #print(expr)
 
-        def func(*args):
-            return eval(expr)
+        params = ', '.join(f'_{i}' for i in range(len(mentioned)))
+        return mentioned, eval(compile(f"lambda {params}: {expr}", constraint, 'eval'))
 
-        self.problem.addConstraint(func, self.vars)
+    def add_constraint(self, constraint):
+        """
+        Adds constraint over the variables it mentions only, all variables if it mentions none
+        """
+        mentioned, func = self.compile(constraint)
+        if mentioned:
+            self.problem.addConstraint(func, mentioned)
+        else:
+            value = func()
+            self.problem.addConstraint(lambda *args: value, sorted(self.vars))
 
     def add_constraints(self):
         for cons in self.constraints:
             self.add_constraint(cons)
 
+    def components(self):
+        """
+        Splits the constraints into independent problems, two constraints being in the same one if they share a
+        variable, by union-find over the variables
+        :return: list of (vars, constraints) pairs sorted by variables, constraints mentioning no variable being in a
+        pair of their own with no variable, variables mentioned by no constraint in none
+        """
+        parent = {v: v for v in self.vars}
+
+        def find(v):
+            while parent[v] != v:
+                parent[v] = parent[parent[v]]
+                v = parent[v]
+            return v
+
+        mentioned = {cons: self.mentioned(cons) for cons in self.constraints}
+        for names in mentioned.values():
+            for name in names[1:]:
+                parent[find(name)] = find(names[0])
+        components = defaultdict(lambda: (set(), set()))
+        for cons, names in mentioned.items():
+            vars, constraints = components[find(names[0]) if names else None]
+            vars.update(names)
+            constraints.add(cons)
+        return sorted(components.values(), key=lambda component: sorted(component[0]))
+
+    def default(self):
+        """
+        Value given to the variables no constraint mentions, 0 or the bound of the range nearest to it
+        """
+        return min(max(0, self.min_range), self.max_range - 1)
+
+    def solve(self):
+        """
+        Returns the first solution found for the constraints, None if there is none
+        Each component of the constraints is solved on its own, over its variables only, so that the search space is
+        the sum and not the product of theirs.
+        """
+        if self.vars and self.min_range >= self.max_range:
+            return None
+        solution = {v: self.default() for v in sorted(self.vars)}
+        for vars, constraints in self.components():
+            if not vars:
+                if not all(self.compile(cons)[1]() for cons in constraints):
+                    return None
+                continue
+            ps = PredicateSolver(vars, constraints, self.min_range, self.max_range)
+            ps.add_constraints()
+            values = ps.problem.getSolution()
+            if values is None:
+                return None
+            solution.update(values)
+        return solution
+
+
+def first_solution(vars, constraints, min_range=-20, max_range=20):
+    """
+    Returns the first solution PredicateSolver finds for constraints, None if there is none
+    """
+    return PredicateSolver(vars, constraints, min_range, max_range).solve()
+
+
+class SolverCache(object):
+    """
+    Results of PredicateSolver, keyed by the sorted variables, the sorted constraints and the range of the problem
+    A result is the first solution found, None if the constraints cannot be satisfied. The same cache may be shared
+    by several test generators. If file_name is given, results are loaded from this JSON file and written back by save.
+    Constraints may be given as terms (see formal_exec.terms), which are printed only the first time their set is met:
+    keys is the key of each problem already met, by (variables, constraints, min_range, max_range) as frozensets.
+    """
+    def __init__(self, file_name=None):
+        self.file_name = file_name
+        self.results = {}
+        self.keys = {}
+        if file_name is not None and os.path.exists(file_name):
+            with open(file_name) as file:
+                for (vars, constraints, min_range, max_range), solution in json.load(file):
+                    self.results[(tuple(vars), tuple(constraints), min_range, max_range)] = solution
+
+    def solve(self, vars, constraints, min_range=-20, max_range=20):
+        """
+        Returns the first solution PredicateSolver finds for constraints, None if there is none
+        """
+        key = self.key(vars, constraints, min_range, max_range)
+        if key not in self.results:
+            self.results[key] = first_solution(*key)
+        return self.get(key)
+
+    def key(self, vars, constraints, min_range=-20, max_range=20):
+        """
+        Returns the key of a problem, its constraints being printed as strings if it was not met before
+        Hash-consed terms being equal only if they are the same object, sets of terms are compared without printing.
+        """
+        problem = frozenset(vars), frozenset(constraints), min_range, max_range
+        key = self.keys.get(problem)
+        if key is None:
+            key = tuple(sorted(vars)), tuple(sorted(str(cons) for cons in constraints)), min_range, max_range
+            self.keys[problem] = key
+        return key
+
+    def get(self, key):
+        """
+        Returns a copy of the result kept for key, which must be in the cache
+        """
+        solution = self.results[key]
+        return None if solution is None else dict(solution)
+
+    def __contains__(self, key):
+        return key in self.results
+
+    def save(self):
+        if self.file_name is not None:
+            with open(self.file_name, 'w') as file:
+                json.dump([[list(key), solution] for key, solution in self.results.items()], file)
+
+    def __len__(self):
+        return len(self.results)
+
 
 if __name__ == '__main__':
     problem = Problem()
@@ -0,0 +1,85 @@
+import weakref
+from model.command import Kind
+
+
+class Term(object):
+    """
+    Node of a symbolic expression
+    Terms are hash-consed: there is a single term for given operator, name and arguments, so that shared subterms are
+    stored once and terms are equal only if they are the same object. Variables and constants have no operator and are
+    given by their name, the text of the variable or of the value. Other terms apply operator to args, one or two
+    terms, and are printed as stringify_expr prints expressions when they are given to the solver. Their text is not
+    kept, so that a term takes the same room however it is printed.
+    """
+    __slots__ = ('operator', 'name', 'args', '__weakref__')
+
+    def __str__(self):
+        return _print(self)
+
+    __repr__ = __str__
+
+
+# Terms alive, by (operator, name, args)
+_terms = weakref.WeakValueDictionary()
+
+
+def _make(operator, name, args):
+    key = (operator, name, args)
+    term = _terms.get(key)
+    if term is None:
+        term = Term()
+        term.operator = operator
+        term.name = name
+        term.args = args
+        _terms[key] = term
+    return term
+
+
+def var(name):
+    return _make(None, name, ())
+
+
+def const(value):
+    return _make(None, str(value), ())
+
+
+def apply(operator, *args):
+    return _make(operator, None, args)
+
+
+def _print(term):
+    """
+    Returns the text of term, written piece by piece into a single buffer, without recursion
+    """
+    pieces = []
+    # Terms left to print and pieces of text between them, last one first
+    stack = [term]
+    while stack:
+        t = stack.pop()
+        if isinstance(t, str):
+            pieces.append(t)
+        elif t.operator is None:
+            pieces.append(t.name)
+        elif len(t.args) == 2:
+            operator = t.operator.replace("&&", "and").replace("||", "or")
+            stack.extend((")", t.args[1], ")" + operator + "(", t.args[0], "("))
+        else:
+            operator = t.operator.replace("!", "not").replace("not=", "!=")
+            stack.extend((")", t.args[0], operator + "("))
+    return "".join(pieces)
+
+
+def term_of(expr, valuation):
+    """
+    Returns the term of an arithmetic or boolean expression, each variable being replaced by its term in valuation,
+    variables missing from valuation standing for themselves
+    :param expr:
+    :param valuation: dictionary from variable names to terms
+    :return:
+    """
+    if expr.kind in (Kind.ARITHM_VAR, Kind.BOOLEAN_VAR):
+        term = valuation.get(expr.name)
+        return var(expr.name) if term is None else term
+    if expr.kind in (Kind.ARITHM_CONST, Kind.BOOLEAN_CONST):
+        return const(expr.value)
+    return apply(expr.operator, *(term_of(child, valuation) for child in expr.children))
@@ -1,16 +1,18 @@
-from anytree import AnyNode
-from model.command import WhileNode
+from model.command import Kind, WhileNode
 
 class ArithmExp(WhileNode):
-    def __init__(self):
-        super().__init__()
-        self.typename = "ArithmExp"
+    __slots__ = ()
+    kind = Kind.ARITHM_EXP
+    typename = "ArithmExp"
 
 
 class ArithmConst(ArithmExp):
+    __slots__ = ('value',)
+    kind = Kind.ARITHM_CONST
+    typename = "ArithmConst"
+
     def __init__(self, value):
         super().__init__()
-        self.typename = "ArithmConst"
         self.value = value
 
     def eval(self, values={}):
@@ -20,9 +22,12 @@ class ArithmConst(ArithmExp):
         return str(self.value)
 
 class ArithmVar(ArithmExp):
+    __slots__ = ('name',)
+    kind = Kind.ARITHM_VAR
+    typename = "ArithmVar"
+
     def __init__(self, name):
         super().__init__()
-        self.typename = "ArithmVar"
         self.name = name
 
     def eval(self, values={}):
@@ -33,6 +38,9 @@ class ArithmVar(ArithmExp):
 
 
 class ArithmBinExp(ArithmExp):
+    __slots__ = ('operator',)
+    kind = Kind.ARITHM_BIN
+    typename = "ArithmBinOP"
 
     OPERATORS = {
         '+': '__add__',
@@ -44,11 +52,8 @@ class ArithmBinExp(ArithmExp):
     }
 
     def __init__(self, operator, left, right):
-        super().__init__()
-        self.typename = "ArithmBinOP"
+        super().__init__(left, right)
         self.operator = operator
-        left.parent = self
-        right.parent = self
 
     def eval(self, values={}):
         return getattr(self.children[0].eval(values), self.OPERATORS[self.operator])(self.children[1].eval(values))
@@ -58,16 +63,17 @@ class ArithmBinExp(ArithmExp):
 
 
 class ArithmUnaryExp(ArithmExp):
+    __slots__ = ('operator',)
+    kind = Kind.ARITHM_UNARY
+    typename = "ArithmUnaryExp"
 
     OPERATORS = {
         '-': '__neg__'
     }
 
     def __init__(self, operator, exp):
-        super().__init__()
-        self.typename = "ArithmUnaryExp"
+        super().__init__(exp)
         self.operator = operator
-        exp.parent = self
 
     def eval(self, values={}):
         return getattr(self.children[0].eval(values), self.OPERATORS[self.operator])()
@@ -77,6 +83,7 @@ class ArithmUnaryExp(ArithmExp):
 
 if __name__ == '__main__':
     from anytree import RenderTree
+    from model.command import to_anytree
     ast = ArithmBinExp('+', ArithmVar('X'), ArithmUnaryExp('-', ArithmConst(2)))
-    print(RenderTree(ast))
+    print(RenderTree(to_anytree(ast)))
     print(ast.eval({'X': 3}))
@@ -0,0 +1,75 @@
+from collections import deque
+
+
+class PathAutomaton(object):
+    """
+    Aho-Corasick automaton over a list of paths of labels, reporting the paths found in a longer one in a single scan
+    State 0 is the root of the trie of the paths. goto[s] maps a label to the next state, fail[s] is the state of the
+    longest proper suffix of s which is also a prefix of some path, ends[s] the numbers of the paths spelled exactly by
+    s and outputs[s] the numbers of all the paths ending at s, fail links included.
+    """
+    __slots__ = ('goto', 'fail', 'ends', 'outputs')
+
+    def __init__(self, paths):
+        goto = [{}]
+        ends = [[]]
+        for n, path in enumerate(paths):
+            s = 0
+            for label in path:
+                t = goto[s].get(label)
+                if t is None:
+                    t = len(goto)
+                    goto[s][label] = t
+                    goto.append({})
+                    ends.append([])
+                s = t
+            ends[s].append(n)
+
+        # Fail links are set breadth first, so that shorter states are done first
+        fail = [0] * len(goto)
+        outputs = [list(numbers) for numbers in ends]
+        queue = deque(goto[0].values())
+        while queue:
+            s = queue.popleft()
+            for label, t in goto[s].items():
+                queue.append(t)
+                f = fail[s]
+                while f and label not in goto[f]:
+                    f = fail[f]
+                fail[t] = goto[f].get(label, 0)
+                outputs[t].extend(outputs[fail[t]])
+
+        self.goto = goto
+        self.fail = fail
+        self.ends = tuple(tuple(numbers) for numbers in ends)
+        self.outputs = tuple(tuple(numbers) for numbers in outputs)
+
+    def __len__(self):
+        return len(self.goto)
+
+    def match(self, path):
+        """
+        Returns the numbers of the paths equal to path, following the trie only
+        """
+        goto = self.goto
+        s = 0
+        for label in path:
+            s = goto[s].get(label)
+            if s is None:
+                return ()
+        return self.ends[s]
+
+    def search(self, path):
+        """
+        Returns the set of the numbers of the paths occurring in path as sub paths
+        """
+        goto, fail, outputs = self.goto, self.fail, self.outputs
+        found = set()
+        s = 0
+        for label in path:
+            while s and label not in goto[s]:
+                s = fail[s]
+            s = goto[s].get(label, 0)
+            if outputs[s]:
+                found.update(outputs[s])
+        return found
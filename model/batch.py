@@ -0,0 +1,140 @@
+import operator
+import numpy as np
+from model.cfg import *
+
+VECTOR_OPERATORS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '//': operator.floordiv,
+    '%': operator.mod,
+    '**': operator.pow,
+    '&&': operator.and_,
+    '||': operator.or_,
+    '^': operator.xor,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+
+def vector_eval(expr, columns):
+    """
+    Evaluates an expression for many valuations at once
+    :param expr:
+    :param columns: maps each variable to the array of its values, one per valuation
+    :return: an array of results, or a scalar for constant expressions
+    """
+    if expr.kind in (Kind.ARITHM_CONST, Kind.BOOLEAN_CONST):
+        return expr.value
+    if expr.kind in (Kind.ARITHM_VAR, Kind.BOOLEAN_VAR):
+        return columns[expr.name]
+    if expr.kind in (Kind.ARITHM_BIN, Kind.BOOLEAN_BIN):
+        return VECTOR_OPERATORS[expr.operator](vector_eval(expr.children[0], columns),
+                                               vector_eval(expr.children[1], columns))
+    if expr.kind == Kind.ARITHM_UNARY:
+        return -np.asarray(vector_eval(expr.children[0], columns))
+    if expr.kind == Kind.BOOLEAN_UNARY:
+        return np.logical_not(vector_eval(expr.children[0], columns))
+    raise ValueError(f"Cannot evaluate expression {expr}")
+
+
+def valuations_to_arrays(data):
+    """
+    Converts a list of valuations (dicts) into one integer array per variable
+    :param data:
+    :return:
+    """
+    variables = set([])
+    for value in data:
+        variables.update(value)
+    return {var: np.array([value[var] for value in data], dtype=np.int64) for var in variables}
+
+
+def batch_execution_paths(cfg, values):
+    """
+    Executes all valuations together through cfg
+    At each step, valuations are grouped by current node, decisions are taken with a boolean mask and assignments are
+    applied to the selected rows only.
+    :param cfg:
+    :param values: maps each variable to an integer array, the i-th valuation being made of the i-th elements
+    :return: the labels of cfg and an array holding on each row the indices in labels of the path of a valuation,
+    padded with -1 after 'END'
+    """
+    compact = compact_cfg(cfg)
+    columns = {var: np.array(column, dtype=np.int64) for var, column in values.items()}
+    size = len(next(iter(columns.values()))) if columns else 0
+    dtype = np.int16 if len(compact) < np.iinfo(np.int16).max else np.int32
+    end = compact.end
+
+    current = np.full(size, compact.start, dtype=dtype)
+    steps = [current.copy()]
+    active = np.arange(size)
+    while len(active) > 0:
+        # Rows are grouped by their node before the step, so that a row moved during the step is not moved again
+        nodes = current[active]
+        for node in np.unique(nodes):
+            rows = active[nodes == node]
+            true_edge = compact.true_edge[node]
+            if true_edge < 0:
+                branches = [(compact.offsets[node], rows)]
+            else:
+                condition = compact.conditions[true_edge]
+                taken = vector_eval(condition, {name: column[rows] for name, column in columns.items()})
+                taken = np.broadcast_to(np.asarray(taken, dtype=bool), rows.shape)
+                branches = [(true_edge, rows[taken]), (compact.false_edge[node], rows[~taken])]
+            for e, selected in branches:
+                if len(selected) == 0:
+                    continue
+                command = compact.commands[e]
+                if command.kind == Kind.ASSIGN:
+                    var = command.children[0].name
+                    if var not in columns:
+                        columns[var] = np.zeros(size, dtype=np.int64)
+                    result = vector_eval(command.children[1], {name: column[selected] for name, column in columns.items()})
+                    columns[var][selected] = result
+                current[selected] = compact.targets[e]
+        active = active[current[active] != end]
+        step = current.copy()
+        step[(steps[-1] == end) | (steps[-1] < 0)] = -1
+        steps.append(step)
+    paths = np.stack(steps, axis=1) if size > 0 else np.zeros((0, 1), dtype=dtype)
+    return list(compact.labels), paths
+
+
+def decode_paths(labels, paths):
+    """
+    Converts the paths returned by batch_execution_paths back into lists of labels
+    :param labels:
+    :param paths:
+    :return:
+    """
+    return [[labels[node] for node in row if node >= 0] for row in paths.tolist()]
+
+
+if __name__ == '__main__':
+    p1 = While(BooleanBinaryExp('>', ArithmVar('X'), ArithmConst(0)),
+               Assign(ArithmVar('X'), ArithmBinExp('-', ArithmVar('X'), ArithmConst(2)), label=1),
+               label=0)
+    p2 = If(BooleanBinaryExp('>=', ArithmVar('X'), ArithmConst(0)), Assign(ArithmVar('Y'), ArithmConst(1), label=3),
+            Assign(ArithmVar('Y'), ArithmConst(-1), label=4), label=2)
+    cfg = ast_to_cfg_with_end(Sequence(p1, p2))
+
+    labels, paths = batch_execution_paths(cfg, valuations_to_arrays([{'X': -1, 'Y': 2}, {'X': 0, 'Y': 2}, {'X': 3, 'Y': 2}]))
+    print(paths)
+    print(decode_paths(labels, paths))
+
+    # Branches of different lengths: rows leaving a branch early must not be moved twice in a step
+    p3 = While(BooleanBinaryExp('>', ArithmVar('X'), ArithmConst(0)),
+               If(BooleanBinaryExp('>', ArithmVar('X'), ArithmConst(5)),
+                  Sequence(Assign(ArithmVar('X'), ArithmBinExp('-', ArithmVar('X'), ArithmConst(3)), label=3),
+                           Assign(ArithmVar('Y'), ArithmBinExp('+', ArithmVar('Y'), ArithmConst(1)), label=4)),
+                  Assign(ArithmVar('X'), ArithmBinExp('-', ArithmVar('X'), ArithmConst(1)), label=5), label=2),
+               label=1)
+    cfg = ast_to_cfg_with_end(p3)
+    data = [{'X': x, 'Y': 0} for x in range(-5, 45)]
+    labels, paths = batch_execution_paths(cfg, valuations_to_arrays(data))
+    assert decode_paths(labels, paths) == [execution_path(cfg, dict(value)) for value in data]
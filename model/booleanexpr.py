@@ -1,17 +1,19 @@
-from anytree import AnyNode
-from model.command import WhileNode
+from model.command import Kind, WhileNode
 
 
 class BooleanExp(WhileNode):
-    def __init__(self):
-        super().__init__()
-        self.typename = "BooleanExp"
+    __slots__ = ()
+    kind = Kind.BOOLEAN_EXP
+    typename = "BooleanExp"
 
 
 class BooleanConst(BooleanExp):
+    __slots__ = ('value',)
+    kind = Kind.BOOLEAN_CONST
+    typename = "BooleanConst"
+
     def __init__(self, value):
         super().__init__()
-        self.typename = "BooleanConst"
         self.value = value
 
     def eval(self, values={}):
@@ -22,9 +24,12 @@ class BooleanConst(BooleanExp):
 
 
 class BooleanVar(BooleanExp):
+    __slots__ = ('name',)
+    kind = Kind.BOOLEAN_VAR
+    typename = "BooleanVar"
+
     def __init__(self, name):
         super().__init__()
-        self.typename = "BooleanVar"
         self.name = name
 
     def eval(self, values):
@@ -35,6 +40,10 @@ class BooleanVar(BooleanExp):
 
 
 class BooleanBinaryExp(BooleanExp):
+    __slots__ = ('operator',)
+    kind = Kind.BOOLEAN_BIN
+    typename = "BooleanBinaryExp"
+
     OPERATORS = {
         '&&': '__and__',
         '||': '__or__',
@@ -48,11 +57,8 @@ class BooleanBinaryExp(BooleanExp):
     }
 
     def __init__(self, operator, left, right):
-        super().__init__()
-        self.typename = "BooleanBinaryExp"
+        super().__init__(left, right)
         self.operator = operator
-        left.parent = self
-        right.parent = self
 
     def eval(self, values={}):
         return getattr(self.children[0].eval(values), self.OPERATORS[self.operator])( self.children[1].eval(values))
@@ -62,11 +68,13 @@ class BooleanBinaryExp(BooleanExp):
 
 
 class BooleanUnaryExp(BooleanExp):
+    __slots__ = ('operator',)
+    kind = Kind.BOOLEAN_UNARY
+    typename = "BooleanUnaryExp"
+
     def __init__(self, operator, exp):
-        super().__init__()
-        self.typename = "BooleanUnaryExp"
+        super().__init__(exp)
         self.operator = operator
-        exp.parent = self
 
     def eval(self, values ={}):
         return not self.children[0].eval(values)
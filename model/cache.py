@@ -0,0 +1,80 @@
+import hashlib
+from collections import OrderedDict
+from model.cfg import *
+
+
+def fingerprint(prog):
+    """
+    Structural hash of a program: programs made of the same nodes, with the same labels, variables, constants and
+    operators share the same fingerprint
+    Nodes being immutable, the hash of a program is computed once and then found by the identity of the program.
+    :param prog:
+    :return:
+    """
+    return fingerprints.get(id(prog), lambda: (prog, structural_hash(prog)))[1]
+
+
+def structural_hash(prog):
+    """
+    Computes the fingerprint of a program
+    """
+    digest = hashlib.sha1()
+    nodes = [prog]
+    while nodes:
+        node = nodes.pop()
+        fields = [node.typename, len(node.children)]
+        for attribute in ('label', 'name', 'value', 'operator'):
+            if hasattr(node, attribute):
+                fields.append((attribute, type(getattr(node, attribute)).__name__, getattr(node, attribute)))
+        digest.update(repr(fields).encode())
+        nodes.extend(reversed(node.children))
+    return digest.hexdigest()
+
+
+class LRUCache(object):
+    """
+    Mapping keeping at most maxsize entries, the least recently used one being evicted first
+    """
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+
+    def get(self, key, compute):
+        """
+        Returns the entry for key, calling compute to create it if needed
+        """
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        value = compute()
+        self.entries[key] = value
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        self.entries.clear()
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+
+# Programs whose fingerprint was computed, with it, keyed by their id: holding the program keeps its id from being reused
+fingerprints = LRUCache(256)
+
+# Control flow graphs built so far, keyed by program fingerprint
+cfg_cache = LRUCache()
+
+
+def get_cfg(prog):
+    """
+    Returns the control flow graph of prog, built once for all programs sharing its fingerprint
+    Analyses of the graph (get_var, all_uses, ...) are kept in the graph itself, so they are shared too. The graph must
+    not be modified.
+    :param prog:
+    :return:
+    """
+    return cfg_cache.get(fingerprint(prog), lambda: ast_to_cfg_with_end(prog))
@@ -1,20 +1,27 @@
-from collections import defaultdict
+from collections import defaultdict, deque
 import copy
+import functools
+import itertools
 import pydot
 from model.booleanexpr import *
 from model.arithmexpr import *
 from model.command import *
+from model.compact_cfg import *
+from model.loops import *
 import matplotlib.pyplot as plt
 import networkx as nx
 
-def ast_to_cfg(prog, previous_edges={("START", BooleanConst(True), Skip())}, cfg=nx.DiGraph()):
+def ast_to_cfg(prog, previous_edges={("START", BooleanConst(True), Skip())}, cfg=None):
     """
     Takes a program as a tree and generates its control flow graph recursively
     Since the tree syntax is not sequential at any given step there are "dangling" edges that are also returned
     :param prog:
     :param previous_edges:
+    :param cfg: graph to add the program to, a new one if None
     :return:
     """
+    if cfg is None:
+        cfg = nx.DiGraph()
 
     if previous_edges is None:
         return cfg, None
@@ -60,6 +67,10 @@ def ast_to_cfg(prog, previous_edges={("START", BooleanConst(True), Skip())}, cfg
 
 
 def ast_to_cfg_with_end(prog):
+    """
+    Returns the complete control flow graph of a program, which is immutable from then on: its analyses are kept in its
+    attributes and would not see any change (see compact_cfg)
+    """
     cfg, final_edges = ast_to_cfg(prog)
     cfg.add_node("END")
     for node, condition, command in final_edges:
@@ -68,10 +79,40 @@ def ast_to_cfg_with_end(prog):
     return cfg
 
 
+def cfg_analysis(function):
+    """
+    Decorator keeping the result of an analysis of a cfg in the graph attributes, so that it is computed once per graph
+    A copy of its containers is returned (see copy_containers), callers being free to modify it.
+    :param function:
+    :return:
+    """
+    @functools.wraps(function)
+    def cached_function(cfg, *args):
+        key = (function.__name__,) + args
+        if key not in cfg.graph:
+            cfg.graph[key] = function(cfg, *args)
+        return copy_containers(cfg.graph[key])
+    return cached_function
+
+
+def copy_containers(value):
+    """
+    Copies the dicts, lists and sets nested in value, sharing everything else, such as expressions, which are compared
+    by identity
+    """
+    if isinstance(value, dict):
+        return {key: copy_containers(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [copy_containers(item) for item in value]
+    if isinstance(value, set):
+        return set(value)
+    return value
+
+
 def get_var_from_exp(expr):
     var = set([])
     if expr.typename == "ArithmVar" or expr.typename == "BooleanVar":
-        var.update(expr.name)
+        var.add(expr.name)
     else:
         for e in list(expr.children)[0:]:
             sub = get_var_from_exp(e)
@@ -80,6 +121,7 @@ def get_var_from_exp(expr):
     return var
 
 
+@cfg_analysis
 def get_var(cfg):
     """
     Returns all variables appearing in cfg
@@ -94,169 +136,318 @@ def get_var(cfg):
     return var
 
 
+class DefRefIndex(object):
+    """
+    Variables assigned (defs) and referenced (refs) on each edge and after each label of a cfg, built once so that the
+    def-use analyses do not walk expression trees again
+    edge_defs and edge_refs map each edge (u, v) to a frozenset of variables, label_defs and label_refs each label to
+    the union over the edges leaving it, defined_at and used_at each variable to the frozenset of labels where it is
+    assigned or referenced.
+    """
+    __slots__ = ('edge_defs', 'edge_refs', 'label_defs', 'label_refs', 'defined_at', 'used_at')
+
+    def __init__(self, cfg):
+        self.edge_defs = {}
+        self.edge_refs = {}
+        label_defs = {u: set() for u in cfg.nodes}
+        label_refs = {u: set() for u in cfg.nodes}
+        defined_at = defaultdict(set)
+        used_at = defaultdict(set)
+        for u, v in cfg.edges:
+            exp, command = cfg[u][v]['booleanexpr'], cfg[u][v]['command']
+            defs, refs = set(), set()
+            if exp is not None:
+                refs.update(get_var_from_exp(exp))
+            if command.typename == "Assign":
+                defs.add(command.children[0].name)
+                refs.update(get_var_from_exp(command.children[1]))
+            self.edge_defs[u, v] = frozenset(defs)
+            self.edge_refs[u, v] = frozenset(refs)
+            label_defs[u].update(defs)
+            label_refs[u].update(refs)
+            for variable in defs:
+                defined_at[variable].add(u)
+            for variable in refs:
+                used_at[variable].add(u)
+        self.label_defs = {u: frozenset(defs) for u, defs in label_defs.items()}
+        self.label_refs = {u: frozenset(refs) for u, refs in label_refs.items()}
+        self.defined_at = {variable: frozenset(labels) for variable, labels in defined_at.items()}
+        self.used_at = {variable: frozenset(labels) for variable, labels in used_at.items()}
+
+
+def def_ref_index(cfg):
+    """
+    Returns the DefRefIndex of cfg, built once and kept in the graph attributes
+    :param cfg:
+    :return:
+    """
+    if 'def_ref_index' not in cfg.graph:
+        cfg.graph['def_ref_index'] = DefRefIndex(cfg)
+    return cfg.graph['def_ref_index']
+
+
+@cfg_analysis
 def get_def(cfg):
     """
     Returns all variables assigned in cfg
     :param cfg:
     :return:
     """
-    var = get_var(cfg)
-    res = set([])
-    for u in cfg.nodes:
-        for v in cfg.neighbors(u):
-            if cfg[u][v]['command'].typename == "Assign":
-                res.update(cfg[u][v]['command'].children[0].name)
-    return res
+    return set(def_ref_index(cfg).defined_at)
 
 
+@cfg_analysis
 def get_ref(cfg):
     """
     Returns all variables whose value is accessed in cfg
     :param cfg:
     :return:
     """
-    var = get_var(cfg)
-    res = set([])
-    for u in cfg.nodes:
-        for v in cfg.neighbors(u):
-            exp, command = cfg[u][v]['booleanexpr'], cfg[u][v]['command']
-            if exp is not None:
-                res.update(get_var_from_exp(exp))
-            if command.typename == "Assign":
-                #print(get_var_from_exp(command.children[1]))
-                res.update(get_var_from_exp(command.children[1]))
-    return res
+    return set(def_ref_index(cfg).used_at)
 
 
 def get_def_after_label(cfg, label):
     """
     Return the variable assigned at this label. If no variable is assigned at this label, return an empty set.
     """
-    res = set()
-    for v in cfg.neighbors(label):
-        if cfg[label][v]['command'].typename == "Assign":
-            res.update(cfg[label][v]['command'].children[0].name)
-    return res
+    return set(def_ref_index(cfg).label_defs[label])
 
 
 def get_ref_after_label(cfg, label):
     """
     Return the set of variables which are referenced at this label.
     """
-    res = set()
-    for v in cfg.neighbors(label):
-        exp, command = cfg[label][v]['booleanexpr'], cfg[label][v]['command']
-        if exp is not None:
-            res.update(get_var_from_exp(exp))
-        if command.typename == "Assign":
-            res.update(get_var_from_exp(command.children[1]))
-    return res
+    return set(def_ref_index(cfg).label_refs[label])
 
 
 def execution_path(graph, values):
-    current_node = 'START'
+    cfg = compact_cfg(graph)
+    labels, targets, conditions, commands = cfg.labels, cfg.targets, cfg.conditions, cfg.commands
+    offsets, true_edge, false_edge = cfg.offsets, cfg.true_edge, cfg.false_edge
+    current_node = cfg.start
     path = []
-    while current_node != "END":
-        path.append(current_node)
-        neighbors = list(graph.neighbors(current_node))
-        # First to choose next node
-        if len(neighbors)==1:
-            next_node = neighbors[0]
-        elif len(neighbors)==2:
-            if_node, else_node = neighbors[0], neighbors[1]
-            condition = graph.edges[current_node, if_node]['booleanexpr']
-            if condition.eval(values):
-                next_node = if_node
-            else:
-                next_node = else_node
+    while current_node != cfg.end:
+        path.append(labels[current_node])
+        # First to choose next edge
+        e = true_edge[current_node]
+        if e < 0:
+            e = offsets[current_node]
+        elif not conditions[e].eval(values):
+            e = false_edge[current_node]
         #  Now we execute and move on
-        values = graph.edges[current_node, next_node]['command'].exec(values=values)
-        current_node = next_node
+        values = commands[e].exec(values=values)
+        current_node = targets[e]
     path.append('END')
     return path
 
 
-def get_paths_exact(cfg, k, u='START'):
+@cfg_analysis
+def path_count_table(cfg, k, v=None):
     """
-    Finds all paths of length k starting from u recursively
+    Counts paths by dynamic programming over (node, remaining length) states
+    :param cfg:
+    :param k:
+    :param v: label where paths end, any node if None
+    :return: table such that table[r][u] is the number of paths of length r from the node numbered u to v
+    """
+    compact = compact_cfg(cfg)
+    target = compact.index[v] if v is not None else None
+    table = [tuple(1 if target is None or u == target else 0 for u in range(len(compact)))]
+    for r in range(1, k + 1):
+        previous = table[-1]
+        table.append(tuple(sum(previous[w] for w in compact.successors(u)) for u in range(len(compact))))
+    return tuple(table)
+
+
+def count_paths_exact(cfg, k, u='START'):
+    """
+    Returns the number of paths of length k starting from u, without listing them
+    """
+    return path_count_table(cfg, k)[k][compact_cfg(cfg).index[u]]
+
+
+def count_paths(cfg, k, u='START', v='END'):
+    """
+    Returns the number of paths of length k down to 1 from u to v, as listed by get_paths, without listing them
+    """
+    compact = compact_cfg(cfg)
+    if v not in compact.index:
+        return 0
+    table = path_count_table(cfg, k, v)
+    return sum(table[r][compact.index[u]] for r in range(1, k + 1))
+
+
+def _walk_counted(cfg, table, k, u):
+    """
+    Yields all paths of length k starting from u, nodes being numbers of the compact cfg
+    Only successors with remaining paths according to the table of path_count_table are visited, so no search is
+    wasted on dead ends.
+    The same list is yielded each time, extended and shortened as the depth first search goes: consumers must copy it.
+    """
+    if table[k][u] == 0:
+        return
+    prefix = [u]
+    if k == 0:
+        yield prefix
+        return
+    stack = [iter(cfg.successors(u))]
+    while stack:
+        w = next(stack[-1], None)
+        if w is None:
+            stack.pop()
+            prefix.pop()
+            continue
+        remaining = k - len(prefix)
+        if table[remaining][w] == 0:
+            continue
+        prefix.append(w)
+        if remaining == 0:
+            yield prefix
+            prefix.pop()
+        else:
+            stack.append(iter(cfg.successors(w)))
+
+
+def loop_forest(cfg):
+    """
+    Returns the LoopForest of cfg, built once and kept in the graph attributes
+    :param cfg:
+    :return:
+    """
+    if 'loop_forest' not in cfg.graph:
+        cfg.graph['loop_forest'] = LoopForest(compact_cfg(cfg))
+    return cfg.graph['loop_forest']
+
+
+def _walk_with_limited_loop(cfg, forest, i, u, v):
+    """
+    Yields all paths with at most i iterations for each loop of forest starting from u, nodes being numbers of the
+    compact cfg
+    The iteration counters of the loops are tuples shared between all paths until one of them changes.
+    The same list is yielded each time, extended and shortened as the depth first search goes: consumers must copy it.
+    """
+    prefix = [u]
+    counters = [(0,) * len(forest)]
+    # Next edge to follow from each node of prefix
+    next_edges = [cfg.offsets[u]]
+    if u == v:
+        yield prefix
+    while next_edges:
+        e = next_edges[-1]
+        if e == cfg.offsets[prefix[-1] + 1]:
+            next_edges.pop()
+            counters.pop()
+            prefix.pop()
+            continue
+        next_edges[-1] = e + 1
+        counts = forest.count_iterations(counters[-1], e)
+        increment = forest.edge_increments[e]
+        if increment >= 0 and counts[increment] > i:
+            continue
+        w = cfg.targets[e]
+        prefix.append(w)
+        counters.append(counts)
+        next_edges.append(cfg.offsets[w])
+        if w == v:
+            yield prefix
+
+
+def _limit(paths, compact, limit):
+    """
+    Converts paths of node numbers into paths of labels, stopping after limit paths if limit is not None
+    """
+    return (compact.to_labels(path) for path in itertools.islice(paths, limit))
+
+
+def iter_paths_exact(cfg, k, u='START', limit=None):
+    """
+    Yields paths of length k starting from u, stopping after limit paths if limit is not None
+    Paths are built one at a time, sharing their prefix during the search, so only the current path is kept in memory.
     :param cfg:
     :param k:
     :param u:
+    :param limit:
     :return:
     """
-    if k == 0:
-        return [[u]]
-    paths = [[u] + path for neighbor in cfg.neighbors(u) for path in get_paths_exact(cfg, k-1, neighbor)]
-    return paths
+    compact = compact_cfg(cfg)
+    return _limit(_walk_counted(compact, path_count_table(cfg, k), k, compact.index[u]), compact, limit)
 
 
-def get_paths(cfg, k, u='START', v='END'):
-    if k == 0:
-        return []
-    return [path for path in get_paths_exact(cfg, k, u) if path[-1] == v] + get_paths(cfg, k - 1, u, v)
+def iter_paths(cfg, k, u='START', v='END', limit=None):
+    """
+    Yields paths of length k down to 1 from u to v, stopping after limit paths if limit is not None
+    Paths are counted first with path_count_table, which is shared by all lengths, so that the search only follows
+    prefixes leading to v.
+    :param cfg:
+    :param k:
+    :param u:
+    :param v:
+    :param limit:
+    :return:
+    """
+    compact = compact_cfg(cfg)
+    if v not in compact.index:
+        return iter([])
+    table = path_count_table(cfg, k, v)
+    paths = (path for length in range(k, 0, -1) for path in _walk_counted(compact, table, length, compact.index[u]))
+    return _limit(paths, compact, limit)
 
 
-def get_paths_with_limited_loop(cfg, i, u='START', v='END', current_loops={}):
+def iter_paths_with_limited_loop(cfg, i, u='START', v='END', limit=None):
     """
-    Finds all paths with at most i loops for each 'While' starting from u recursively
+    Yields paths with at most i loops for each 'While' from u to v, stopping after limit paths if limit is not None
+    Loops are the ones of the loop_forest of cfg, so branches of an 'If' are not counted as loops.
+    :param cfg:
+    :param i:
+    :param u:
+    :param v:
+    :param limit:
+    :return:
     """
+    compact = compact_cfg(cfg)
+    paths = _walk_with_limited_loop(compact, loop_forest(cfg), i, compact.index[u], compact.index.get(v))
+    return _limit(paths, compact, limit)
 
-    # Loops currently running
-    current_loops_labels = [w for w in current_loops if current_loops[w][0] > 0]
 
-    for w in current_loops_labels:
-        if current_loops[w][0] > i:
-            return []
+def get_paths_exact(cfg, k, u='START'):
+    """
+    Finds all paths of length k starting from u
+    :param cfg:
+    :param k:
+    :param u:
+    :return:
+    """
+    return list(iter_paths_exact(cfg, k, u))
+
+
+def get_paths(cfg, k, u='START', v='END'):
+    return list(iter_paths(cfg, k, u, v))
 
-    res = []
-    if u == v:
-        res = [[u]]
-    # Case of a WHILE (or an IF) loop, meaning that we increment counter if we stay in the loop, and erase if when exiting
-    neighbors = list(cfg.neighbors(u))
-    if len(neighbors) == 2:
-        # Stay in the loop
-        new_current_loops = copy.deepcopy(current_loops)
-        if u in new_current_loops and new_current_loops[u][0] > 0:
-            # Continue to loop
-            new_current_loops[u][0] += 1
-        else:
-            # Start to loop
-            new_current_loops[u] = [1, list(current_loops.keys())]
-        res += [[u] + path for path in get_paths_with_limited_loop(cfg, i, neighbors[0], v, new_current_loops) if path != []]
-        # Exit the loop
-        new_current_loops = copy.deepcopy(current_loops)
-        if u in new_current_loops:
-            new_current_loops[u] = [0, []]  # Remove this loop
-        for sub_u in current_loops_labels:  # Remove all sub-loops
-            if u in new_current_loops[sub_u][1]:
-                new_current_loops[sub_u] = [0, []]
-        res += [[u] + path for path in get_paths_with_limited_loop(cfg, i, neighbors[1], v, new_current_loops) if path != []]
-        return res
-
-    return res + [[u] + path for neighbor in cfg.neighbors(u) for path in get_paths_with_limited_loop(cfg, i, neighbor, v, current_loops) if path != []]
+
+def get_paths_with_limited_loop(cfg, i, u='START', v='END'):
+    """
+    Finds all paths with at most i loops for each 'While' starting from u
+    """
+    return list(iter_paths_with_limited_loop(cfg, i, u, v))
 
 
 def check_var_next_reference(cfg, variable, path):
     """
     Check if a variable is referenced in a path before being defined again.
     """
-    if len(path) <= 1:
-        return False
-    u = path[0]
-    v = path[1]
-    exp, command = cfg[u][v]['booleanexpr'], cfg[u][v]['command']
-    # If variable is referenced in the expression
-    if exp is not None and variable in get_var_from_exp(exp):
-        return True
-    # If variable is assigned to an other variable
-    if command.typename == "Assign" and variable in get_var_from_exp(command.children[1]):
-        return True
-    # If variable is defined again
-    if command.typename == "Assign" and variable == command.children[0].name:
-        return False
-    return check_var_next_reference(cfg, variable, path[1:])
+    index = def_ref_index(cfg)
+    for i in range(len(path) - 1):
+        edge = (path[i], path[i + 1])
+        # If variable is referenced in the expression or assigned to an other variable
+        if variable in index.edge_refs[edge]:
+            return True
+        # If variable is defined again
+        if variable in index.edge_defs[edge]:
+            return False
+    return False
 
 
+@cfg_analysis
 def get_assigns(cfg):
     """
     Returns all labels of assigns in cfg
@@ -272,16 +463,20 @@ def get_assigns(cfg):
 def get_assigns_with_next_reference(cfg, path):
     """
     Get list of assigns in a path which verify the check_var_next_reference function
+    The path is scanned backwards, keeping for each variable whether it is referenced before being defined again.
     """
-    if len(path) <= 1:
-        return set()
-    u = path[0]
-    v = path[1]
-    command = cfg[u][v]['command']
-    res = get_assigns_with_next_reference(cfg, path[1:])
-    if command.typename == "Assign":
-        if check_var_next_reference(cfg, command.children[0].name, path[1:]):
-            res.add(u)
+    index = def_ref_index(cfg)
+    res = set()
+    referenced_next = {}
+    for i in range(len(path) - 2, -1, -1):
+        edge = (path[i], path[i + 1])
+        for variable in index.edge_defs[edge]:
+            if referenced_next.get(variable, False):
+                res.add(path[i])
+        for variable in index.edge_defs[edge]:
+            referenced_next[variable] = False
+        for variable in index.edge_refs[edge]:
+            referenced_next[variable] = True
     return res
 
 
@@ -299,38 +494,80 @@ def check_no_assign_sub_path(cfg, path, variable):
     if len(path) < 2:
         return False
 
+    index = def_ref_index(cfg)
+
     # Check if variable is assigned after u
-    if variable not in get_def_after_label(cfg, u):
+    if variable not in index.label_defs[u]:
         return False
 
     # Check if variable is referenced after v
-    if variable not in get_ref_after_label(cfg, v):
+    if variable not in index.label_refs[v]:
         return False
 
     for i in range(1, len(path) - 1):
         w = path[i]
-        if variable in get_def_after_label(cfg, w):
+        if variable in index.label_defs[w]:
             return False
     return True
 
 
+@cfg_analysis
+def reaching_definitions(cfg):
+    """
+    Computes with a worklist the definitions reaching each node of cfg
+    A definition (u, x) is the assignment of x on the edges leaving u. It reaches v if a path goes from u to v without
+    assigning x again before v.
+    :param cfg:
+    :return: dict mapping each label to the frozenset of definitions reaching it
+    """
+    compact = compact_cfg(cfg)
+    labels = compact.labels
+    label_defs = def_ref_index(cfg).label_defs
+    defs = [label_defs[label] for label in labels]
+    reach_in = [frozenset()] * len(compact)
+    reach_out = [frozenset((u, x) for x in defs[u]) for u in range(len(compact))]
+    worklist = deque(range(len(compact)))
+    queued = [True] * len(compact)
+    while worklist:
+        u = worklist.popleft()
+        queued[u] = False
+        reach_in[u] = frozenset().union(*(reach_out[w] for w in compact.predecessors(u)))
+        # Definitions of the variables assigned at u are killed, the ones made at u are generated
+        out = reach_out[u].union(d for d in reach_in[u] if d[1] not in defs[u])
+        if out != reach_out[u]:
+            reach_out[u] = out
+            for w in compact.successors(u):
+                if not queued[w]:
+                    queued[w] = True
+                    worklist.append(w)
+    return {labels[v]: frozenset((labels[u], x) for u, x in reach_in[v]) for v in range(len(compact))}
+
+
+@cfg_analysis
+def def_use_pairs(cfg):
+    """
+    Returns for every variable the pairs of nodes where it is assigned at u and not assigned again until it is
+    referenced at v
+    :param cfg:
+    :return: dict mapping each variable to a frozenset of pairs
+    """
+    pairs = {variable: set() for variable in get_var(cfg)}
+    label_refs = def_ref_index(cfg).label_refs
+    for v, definitions in reaching_definitions(cfg).items():
+        refs = label_refs[v]
+        for u, variable in definitions:
+            if variable in refs:
+                pairs.setdefault(variable, set()).add((u, v))
+    return {variable: frozenset(variable_pairs) for variable, variable_pairs in pairs.items()}
+
+
 def all_uses(cfg, variable):
     """
     Returns all pairs of nodes where variable is assigned at u and not used until v
-    Todo: do this without brute force
     :param variable:
     :return:
     """
-    res = set()
-    for u in cfg.nodes:
-        for v in cfg.nodes:
-            all_simple_paths = get_paths(cfg, len(cfg), u, v)
-            for sp in all_simple_paths:
-                if check_no_assign_sub_path(cfg, sp, variable):
-                    #print((u, v))
-                    res.add((u, v))
-                    break
-    return res
+    return set(def_use_pairs(cfg).get(variable, ()))
 
 
 def sub_paths(path, u, v):
@@ -363,6 +600,7 @@ def get_conditions_from_expression(expr):
     return cond
 
 
+@cfg_analysis
 def get_all_conditions(cfg):
     """
     Return all boolean condition with their label in cfg
@@ -375,34 +613,52 @@ def get_all_conditions(cfg):
     return cond
 
 
-def get_conditions_values(cfg, values, conditions):
+def execution_trace(graph, values, conditions):
     """
-    Get values taken for each condition for this execution
+    Executes the program from a valuation, recording its path and the values taken by the conditions of each decision
+    reached. The valuation given is left untouched.
+    :param graph:
+    :param values:
+    :param conditions: atomic conditions of each decision, as returned by get_all_conditions
+    :return: path of labels, as given by execution_path, and list of (label, condition, value) taken, without
+    repetition
     """
-    current_node = 'START'
+    cfg = compact_cfg(graph)
+    labels, targets, edge_conditions, commands = cfg.labels, cfg.targets, cfg.conditions, cfg.commands
+    offsets, true_edge, false_edge = cfg.offsets, cfg.true_edge, cfg.false_edge
+    values = dict(values)
+    current_node = cfg.start
+    path = []
     conditions_values = []
-    while current_node != "END":
-        neighbors = list(cfg.neighbors(current_node))
-        # First to choose next node
-        if len(neighbors)==1:
-            next_node = neighbors[0]
-        elif len(neighbors)==2:
-            if_node, else_node = neighbors[0], neighbors[1]
-            condition = cfg.edges[current_node, if_node]['booleanexpr']
-            if condition.eval(values):
-                next_node = if_node
-            else:
-                next_node = else_node
+    seen = set()
+    while current_node != cfg.end:
+        label = labels[current_node]
+        path.append(label)
+        # First to choose next edge
+        e = true_edge[current_node]
+        if e < 0:
+            e = offsets[current_node]
+        else:
             # We check the value of every condition
-            if current_node in conditions:
-                for cond_expr in conditions[current_node]:
-                    cond_value = cond_expr.eval(values)
-                    if (current_node, cond_expr, cond_value) not in conditions_values:
-                        conditions_values.append((current_node, cond_expr, cond_value))
+            for cond_expr in conditions.get(label, ()):
+                cond = (label, cond_expr, cond_expr.eval(values))
+                if cond not in seen:
+                    seen.add(cond)
+                    conditions_values.append(cond)
+            if not edge_conditions[e].eval(values):
+                e = false_edge[current_node]
         #  Now we execute and move on
-        values = cfg.edges[current_node, next_node]['command'].exec(values=values)
-        current_node = next_node
-    return conditions_values
+        values = commands[e].exec(values=values)
+        current_node = targets[e]
+    path.append('END')
+    return path, conditions_values
+
+
+def get_conditions_values(cfg, values, conditions):
+    """
+    Get values taken for each condition for this execution
+    """
+    return execution_trace(cfg, values, conditions)[1]
 
 if __name__ == '__main__':
     from anytree import RenderTree
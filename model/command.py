@@ -1,10 +1,47 @@
+from enum import IntEnum
 from anytree import AnyNode
 
 
-class WhileNode(AnyNode):
+class Kind(IntEnum):
+    """
+    Integer tag identifying the type of a node
+    """
+    COMMAND = 0
+    SKIP = 1
+    ASSIGN = 2
+    SEQUENCE = 3
+    IF = 4
+    WHILE = 5
+    ARITHM_EXP = 10
+    ARITHM_CONST = 11
+    ARITHM_VAR = 12
+    ARITHM_BIN = 13
+    ARITHM_UNARY = 14
+    BOOLEAN_EXP = 20
+    BOOLEAN_CONST = 21
+    BOOLEAN_VAR = 22
+    BOOLEAN_BIN = 23
+    BOOLEAN_UNARY = 24
+
+
+class WhileNode(object):
     """
     Functions common to all node types are defined here
+    Nodes are immutable: children are given at creation and kept in a tuple, so copying a node returns the node itself
     """
+    __slots__ = ('children',)
+    kind = None
+    typename = "WhileNode"
+
+    def __init__(self, *children):
+        self.children = children
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
     def get_labels(self, typename=None):
         labels = set([])
         if self.label is not None and (typename == self.typename or typename is None):
@@ -41,9 +78,12 @@ class WhileNode(AnyNode):
 
 
 class Command(WhileNode):
-    def __init__(self, label):
-        super().__init__()
-        self.typename = "Command"
+    __slots__ = ('label',)
+    kind = Kind.COMMAND
+    typename = "Command"
+
+    def __init__(self, label, *children):
+        super().__init__(*children)
         if label is not None:
             self.label = label
         else:
@@ -54,25 +94,29 @@ class Command(WhileNode):
 
 
 class Skip(Command):
+    __slots__ = ()
+    kind = Kind.SKIP
+    typename = "Skip"
+
     def __init__(self):
         super().__init__(None)
-        self.typename = "Skip"
 
-    def exec(self, values={}, path=[]):
-        if self.label is not None:
+    def exec(self, values={}, path=None):
+        if path is not None and self.label is not None:
             path.append(self.label)
         return values
 
 
 class Assign(Command):
+    __slots__ = ()
+    kind = Kind.ASSIGN
+    typename = "Assign"
+
     def __init__(self, variable, expression, label):
-        super().__init__(label=label)
-        self.typename = "Assign"
-        variable.parent = self
-        expression.parent = self
+        super().__init__(label, variable, expression)
 
-    def exec(self, values={}, path=[]):
-        if self.label is not None:
+    def exec(self, values={}, path=None):
+        if path is not None and self.label is not None:
             path.append(self.label)
         variable = self.children[0]
         expression = self.children[1]
@@ -84,14 +128,15 @@ class Assign(Command):
 
 
 class Sequence(Command):
+    __slots__ = ()
+    kind = Kind.SEQUENCE
+    typename = "Sequence"
+
     def __init__(self, command1, command2):
-        super().__init__(None)
-        self.typename = "Sequence"
-        command1.parent = self
-        command2.parent = self
+        super().__init__(None, command1, command2)
 
-    def exec(self, values={}, path=[]):
-        if self.label is not None:
+    def exec(self, values={}, path=None):
+        if path is not None and self.label is not None:
             path.append(self.label)
         for command in list(self.children):
             values = command.exec(values, path)
@@ -102,15 +147,15 @@ class Sequence(Command):
 
 
 class If(Command):
+    __slots__ = ()
+    kind = Kind.IF
+    typename = "If"
+
     def __init__(self, expr, thencommand, elsecommand, label):
-        super().__init__(label=label)
-        self.typename = "If"
-        expr.parent = self
-        thencommand.parent = self
-        elsecommand.parent = self
-
-    def exec(self, values={}, path=[]):
-        if self.label is not None:
+        super().__init__(label, expr, thencommand, elsecommand)
+
+    def exec(self, values={}, path=None):
+        if path is not None and self.label is not None:
             path.append(self.label)
         expr = self.children[0]
         thencommand = self.children[1]
@@ -126,14 +171,15 @@ class If(Command):
 
 
 class While(Command):
+    __slots__ = ()
+    kind = Kind.WHILE
+    typename = "While"
+
     def __init__ (self, expr, command, label):
-        super().__init__(label=label)
-        self.typename = "While"
-        expr.parent=self
-        command.parent=self
+        super().__init__(label, expr, command)
 
-    def exec(self, values={}, path=[]):
-        if self.label is not None:
+    def exec(self, values={}, path=None):
+        if path is not None and self.label is not None:
             path.append(self.label)
         expr = self.children[0]
         command = self.children[1]
@@ -147,6 +193,22 @@ class While(Command):
         return f"{self.label}: While {self.children[0]}: \n\t" + "\n\t".join(repr(self.children[1]).split('\n'))
 
 
+def to_anytree(node, parent=None):
+    """
+    Builds an anytree copy of a node and its children, for code still expecting anytree nodes (RenderTree, searches...)
+    Each AnyNode keeps the original node in its 'node' attribute
+    :param node:
+    :param parent:
+    :return:
+    """
+    attributes = {attribute: getattr(node, attribute) for attribute in ('label', 'name', 'value', 'operator')
+                  if hasattr(node, attribute)}
+    tree = AnyNode(parent=parent, typename=node.typename, node=node, **attributes)
+    for child in node.children:
+        to_anytree(child, tree)
+    return tree
+
+
 if __name__ == '__main__':
     import os, sys
     sys.path.insert(1, os.path.join(sys.path[0], '..'))
@@ -155,7 +217,7 @@ if __name__ == '__main__':
     from anytree import RenderTree
 
     ast = If(BooleanBinaryExp('>=', ArithmVar('X'), ArithmConst(0)), Assign(ArithmVar('Y'), ArithmConst(1),label=2), label=1)
-    print(RenderTree(ast))
+    print(RenderTree(to_anytree(ast)))
 
     val = {'X': 10, 'Y': 0}
 
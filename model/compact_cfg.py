@@ -0,0 +1,116 @@
+import networkx as nx
+
+
+class CompactCFG(object):
+    """
+    Frozen control flow graph whose nodes are numbered from 0 to n-1
+    Successors are stored CSR-style: the edges leaving node u are numbered from offsets[u] to offsets[u + 1] - 1, edge e
+    going to targets[e] with its boolean expression and command in conditions[e] and commands[e].
+    For a decision node, true_edge and false_edge give the edge taken when its condition holds or not, -1 elsewhere.
+    Predecessors are stored the same way in pred_offsets and sources.
+    """
+    __slots__ = ('labels', 'index', 'offsets', 'targets', 'conditions', 'commands', 'true_edge', 'false_edge',
+                 'pred_offsets', 'sources', 'start', 'end')
+
+    def __init__(self, labels, offsets, targets, conditions, commands):
+        set_attribute = super().__setattr__
+        set_attribute('labels', tuple(labels))
+        set_attribute('index', {label: i for i, label in enumerate(self.labels)})
+        set_attribute('offsets', tuple(offsets))
+        set_attribute('targets', tuple(targets))
+        set_attribute('conditions', tuple(conditions))
+        set_attribute('commands', tuple(commands))
+
+        n = len(self.labels)
+        true_edge = [-1] * n
+        false_edge = [-1] * n
+        incoming = [[] for _ in range(n)]
+        for u in range(n):
+            if self.offsets[u + 1] - self.offsets[u] == 2:
+                true_edge[u], false_edge[u] = self.offsets[u], self.offsets[u] + 1
+            for e in range(self.offsets[u], self.offsets[u + 1]):
+                incoming[self.targets[e]].append(u)
+        pred_offsets = [0]
+        for sources in incoming:
+            pred_offsets.append(pred_offsets[-1] + len(sources))
+        set_attribute('true_edge', tuple(true_edge))
+        set_attribute('false_edge', tuple(false_edge))
+        set_attribute('pred_offsets', tuple(pred_offsets))
+        set_attribute('sources', tuple(u for sources in incoming for u in sources))
+        set_attribute('start', self.index.get('START', -1))
+        set_attribute('end', self.index.get('END', -1))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CompactCFG is frozen")
+
+    def __reduce__(self):
+        return CompactCFG, (self.labels, self.offsets, self.targets, self.conditions, self.commands)
+
+    def __len__(self):
+        return len(self.labels)
+
+    @classmethod
+    def from_digraph(cls, cfg):
+        """
+        Numbers the nodes of a networkx control flow graph, keeping the order of nodes and of their neighbors
+        :param cfg:
+        :return:
+        """
+        labels = list(cfg.nodes)
+        index = {label: i for i, label in enumerate(labels)}
+        offsets, targets, conditions, commands = [0], [], [], []
+        for u in labels:
+            for v in cfg.neighbors(u):
+                targets.append(index[v])
+                conditions.append(cfg[u][v].get('booleanexpr'))
+                commands.append(cfg[u][v].get('command'))
+            offsets.append(len(targets))
+        return cls(labels, offsets, targets, conditions, commands)
+
+    def to_digraph(self):
+        """
+        Converts back into a networkx control flow graph, as built by ast_to_cfg_with_end
+        :return:
+        """
+        cfg = nx.DiGraph()
+        cfg.add_nodes_from(self.labels)
+        for u in range(len(self.labels)):
+            for e in range(self.offsets[u], self.offsets[u + 1]):
+                cfg.add_edge(self.labels[u], self.labels[self.targets[e]], booleanexpr=self.conditions[e],
+                             command=self.commands[e])
+        return cfg
+
+    def successors(self, u):
+        return self.targets[self.offsets[u]:self.offsets[u + 1]]
+
+    def predecessors(self, u):
+        return self.sources[self.pred_offsets[u]:self.pred_offsets[u + 1]]
+
+    def edge(self, u, v):
+        """
+        Returns the number of the edge from u to v
+        """
+        for e in range(self.offsets[u], self.offsets[u + 1]):
+            if self.targets[e] == v:
+                return e
+        raise KeyError(f"The edge {(self.labels[u], self.labels[v])} is not in the graph.")
+
+    def to_labels(self, path):
+        """
+        Converts a path of node numbers into a path of labels
+        """
+        labels = self.labels
+        return [labels[u] for u in path]
+
+
+def compact_cfg(cfg):
+    """
+    Returns the compact form of a networkx control flow graph, converted once and kept in the graph attributes
+    Built control flow graphs are immutable: the compact form, like every analysis cached in the graph attributes, is
+    never converted again, so the graph must not be modified once it is analysed.
+    :param cfg:
+    :return:
+    """
+    if 'compact' not in cfg.graph:
+        cfg.graph['compact'] = CompactCFG.from_digraph(cfg)
+    return cfg.graph['compact']
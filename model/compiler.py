@@ -0,0 +1,136 @@
+from model.arithmexpr import *
+from model.booleanexpr import *
+from model.command import *
+from model.cache import fingerprint, LRUCache
+
+# Python operators equivalent to the While operators (the dunder methods called by eval)
+PY_OPERATORS = {
+    '+': '+',
+    '-': '-',
+    '*': '*',
+    '//': '//',
+    '%': '%',
+    '**': '**',
+    '&&': '&',
+    '||': '|',
+    '^': '^',
+    '==': '==',
+    '!=': '!=',
+    '<': '<',
+    '<=': '<=',
+    '>': '>',
+    '>=': '>=',
+}
+
+# Compiled programs, keyed by program fingerprint
+compiled_cache = LRUCache()
+
+
+def expr_to_source(expr, local_names):
+    """
+    Translates an arithmetic or boolean expression into a Python expression
+    :param expr:
+    :param local_names: maps each program variable to the local variable holding its value, updated in place
+    :return:
+    """
+    if expr.kind in (Kind.ARITHM_CONST, Kind.BOOLEAN_CONST):
+        return repr(expr.value)
+    if expr.kind in (Kind.ARITHM_VAR, Kind.BOOLEAN_VAR):
+        if expr.name not in local_names:
+            local_names[expr.name] = f"v{len(local_names)}"
+        return local_names[expr.name]
+    if expr.kind in (Kind.ARITHM_BIN, Kind.BOOLEAN_BIN):
+        left = expr_to_source(expr.children[0], local_names)
+        right = expr_to_source(expr.children[1], local_names)
+        return f"({left} {PY_OPERATORS[expr.operator]} {right})"
+    if expr.kind == Kind.ARITHM_UNARY:
+        return f"(-{expr_to_source(expr.children[0], local_names)})"
+    if expr.kind == Kind.BOOLEAN_UNARY:
+        return f"(not {expr_to_source(expr.children[0], local_names)})"
+    raise ValueError(f"Cannot compile expression {expr}")
+
+
+def command_to_source(command, lines, local_names, indent=1):
+    """
+    Translates a command into Python statements appended to lines
+    Every label reached is appended to the path in the same order as execution_path walks the control flow graph
+    :param command:
+    :param lines:
+    :param local_names:
+    :param indent:
+    :return:
+    """
+    pad = "    " * indent
+    if command.kind == Kind.SEQUENCE:
+        for child in list(command.children):
+            command_to_source(child, lines, local_names, indent)
+        return lines
+
+    lines.append(f"{pad}append({command.label!r})")
+    if command.kind == Kind.ASSIGN:
+        variable, expression = command.children
+        source = expr_to_source(expression, local_names)
+        lines.append(f"{pad}{expr_to_source(variable, local_names)} = {source}")
+    elif command.kind == Kind.IF:
+        condition, thencommand, elsecommand = command.children
+        lines.append(f"{pad}if {expr_to_source(condition, local_names)}:")
+        command_to_source(thencommand, lines, local_names, indent + 1)
+        lines.append(f"{pad}else:")
+        command_to_source(elsecommand, lines, local_names, indent + 1)
+    elif command.kind == Kind.WHILE:
+        condition, do = command.children
+        lines.append(f"{pad}while {expr_to_source(condition, local_names)}:")
+        command_to_source(do, lines, local_names, indent + 1)
+        # Going back to the condition reaches the label again
+        lines.append(f"{pad}    append({command.label!r})")
+    elif command.kind != Kind.SKIP:
+        raise ValueError(f"Cannot compile command {command}")
+    return lines
+
+
+def prog_to_source(prog):
+    """
+    Generates the source of a Python function run(values) returning the execution path of prog for this valuation,
+    as execution_path would on its control flow graph
+    :param prog:
+    :return:
+    """
+    local_names = {}
+    body = command_to_source(prog, [], local_names)
+    lines = ["def run(values):"]
+    for name, local in local_names.items():
+        lines.append(f"    {local} = values.get({name!r})")
+    lines.append("    path = ['START']")
+    lines.append("    append = path.append")
+    lines += body
+    lines.append("    append('END')")
+    lines.append("    return path")
+    return "\n".join(lines) + "\n"
+
+
+def compile_prog(prog):
+    """
+    Compiles prog into a native Python function giving its execution path for a valuation
+    The function is compiled once and reused for every program with the same fingerprint.
+    Unlike execution_path, the valuation given to the function is left untouched.
+    :param prog:
+    :return:
+    """
+    def compile_run():
+        namespace = {}
+        exec(compile(prog_to_source(prog), "<while program>", "exec"), namespace)
+        return namespace['run']
+    return compiled_cache.get(fingerprint(prog), compile_run)
+
+
+if __name__ == '__main__':
+    p1 = While(BooleanBinaryExp('>', ArithmVar('X'), ArithmConst(0)),
+               Assign(ArithmVar('X'), ArithmBinExp('-', ArithmVar('X'), ArithmConst(2)), label=1),
+               label=0)
+    p2 = If(BooleanBinaryExp('>=', ArithmVar('X'), ArithmConst(0)), Assign(ArithmVar('Y'), ArithmConst(1), label=3),
+            Assign(ArithmVar('Y'), ArithmConst(-1), label=4), label=2)
+    prog = Sequence(p1, p2)
+
+    print(prog_to_source(prog))
+    run = compile_prog(prog)
+    print(run({'X': 3, 'Y': 0}))
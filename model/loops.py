@@ -0,0 +1,148 @@
+def reverse_postorder(cfg, start):
+    """
+    Returns the nodes of a compact cfg reachable from start, in reverse postorder of a depth first search
+    :param cfg:
+    :param start:
+    :return:
+    """
+    order = []
+    visited = {start}
+    stack = [(start, iter(cfg.successors(start)))]
+    while stack:
+        u, successors = stack[-1]
+        w = next(successors, None)
+        if w is None:
+            stack.pop()
+            order.append(u)
+        elif w not in visited:
+            visited.add(w)
+            stack.append((w, iter(cfg.successors(w))))
+    order.reverse()
+    return order
+
+
+def immediate_dominators(cfg, start=None):
+    """
+    Computes the immediate dominator of each node of a compact cfg with the iterative algorithm of Cooper, Harvey and
+    Kennedy
+    :param cfg:
+    :param start: entry node, cfg.start if None
+    :return: list giving the immediate dominator of each node, start being its own, -1 for unreachable nodes
+    """
+    if start is None:
+        start = cfg.start
+    order = reverse_postorder(cfg, start)
+    position = {u: i for i, u in enumerate(order)}
+    idom = [-1] * len(cfg)
+    idom[start] = start
+
+    def intersect(a, b):
+        while a != b:
+            while position[a] > position[b]:
+                a = idom[a]
+            while position[b] > position[a]:
+                b = idom[b]
+        return a
+
+    changed = True
+    while changed:
+        changed = False
+        for u in order[1:]:
+            new_idom = -1
+            for w in cfg.predecessors(u):
+                if idom[w] != -1:
+                    new_idom = w if new_idom == -1 else intersect(w, new_idom)
+            if idom[u] != new_idom:
+                idom[u] = new_idom
+                changed = True
+    return idom
+
+
+class LoopForest(object):
+    """
+    Loop nesting forest of a compact cfg
+    Loops are found from back edges (u, h), h dominating u. They are numbered so that a loop comes before the loops
+    nested in it: headers[l] is the header of loop l, bodies[l] the frozenset of its nodes (header included) and
+    parents[l] the loop directly containing it, -1 for outermost loops.
+    For each edge e of the cfg, edge_resets[e] gives the loops whose iteration counter starts again when e is followed
+    (the loops it leaves and the loop it enters from outside), and edge_increments[e] the loop starting a new iteration,
+    -1 if none.
+    """
+    __slots__ = ('idom', 'back_edges', 'headers', 'bodies', 'parents', 'edge_resets', 'edge_increments')
+
+    def __init__(self, cfg, start=None):
+        if start is None:
+            start = cfg.start
+        self.idom = immediate_dominators(cfg, start)
+        order = reverse_postorder(cfg, start)
+
+        self.back_edges = tuple((u, h) for u in order for h in cfg.successors(u) if self.dominates(h, u))
+        # Natural loops, merging loops sharing their header
+        bodies = {}
+        for u, h in self.back_edges:
+            body = bodies.setdefault(h, {h})
+            stack = [u]
+            while stack:
+                w = stack.pop()
+                if w not in body:
+                    body.add(w)
+                    stack.extend(cfg.predecessors(w))
+        self.headers = tuple(h for h in order if h in bodies)
+        self.bodies = tuple(frozenset(bodies[h]) for h in self.headers)
+
+        parents = []
+        for l, h in enumerate(self.headers):
+            enclosing = [m for m in range(l) if h in self.bodies[m]]
+            parents.append(min(enclosing, key=lambda m: len(self.bodies[m])) if enclosing else -1)
+        self.parents = tuple(parents)
+
+        edge_resets, edge_increments = [], []
+        for u in range(len(cfg)):
+            for e in range(cfg.offsets[u], cfg.offsets[u + 1]):
+                w = cfg.targets[e]
+                resets, increment = [], -1
+                for l, body in enumerate(self.bodies):
+                    if (u in body and w not in body) or (w == self.headers[l] and u not in body):
+                        resets.append(l)
+                    elif u == self.headers[l] and w in body:
+                        increment = l
+                edge_resets.append(tuple(resets))
+                edge_increments.append(increment)
+        self.edge_resets = tuple(edge_resets)
+        self.edge_increments = tuple(edge_increments)
+
+    def __len__(self):
+        return len(self.headers)
+
+    def dominates(self, a, b):
+        """
+        Checks if every path from the entry to b goes through a
+        """
+        if self.idom[b] == -1:
+            return False
+        while b != a:
+            if self.idom[b] == b:
+                return False
+            b = self.idom[b]
+        return True
+
+    def children(self, l):
+        """
+        Returns the loops directly nested in loop l, or the outermost loops if l is -1
+        """
+        return [m for m, parent in enumerate(self.parents) if parent == l]
+
+    def count_iterations(self, counts, e):
+        """
+        Returns the iteration counters of the loops after following edge e, counts being the counters before
+        Counters are tuples indexed by loop number, shared as long as they are not modified.
+        """
+        resets, increment = self.edge_resets[e], self.edge_increments[e]
+        if not resets and increment < 0:
+            return counts
+        new_counts = list(counts)
+        for l in resets:
+            new_counts[l] = 0
+        if increment >= 0:
+            new_counts[increment] += 1
+        return tuple(new_counts)
@@ -0,0 +1,192 @@
+import hashlib
+import os
+import numpy as np
+from tests.tests import *
+from tests.minimize import *
+
+
+def suite_hash(data):
+    """
+    Hash of a list of valuations, independent of the order of the variables in each valuation
+    """
+    digest = hashlib.sha1()
+    for value in data:
+        digest.update(repr(sorted(value.items())).encode())
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+class CoverageMatrix(object):
+    """
+    Sparse boolean matrix telling which obligations each valuation of a suite covers, for several criteria
+    Row r stands for valuation r of the suite. The columns of criteria[c] are offsets[c] to offsets[c + 1] - 1, column
+    offsets[c] + n being obligation n of the criterion, described by columns[offsets[c] + n].
+    Rows are compressed: the columns covered by row r are indices[indptr[r]:indptr[r + 1]], in increasing order. On
+    disk, the matrix is named after the fingerprint of the program, the hash of the suite and the parameters k and i of
+    k-TC and i-TB.
+    """
+    def __init__(self, fingerprint, suite_hash, k, i, criteria, offsets, columns, indptr, indices):
+        self.fingerprint = fingerprint
+        self.suite_hash = suite_hash
+        self.k = k
+        self.i = i
+        self.criteria = list(criteria)
+        self.offsets = list(offsets)
+        self.columns = list(columns)
+        self.indptr = indptr
+        self.indices = indices
+
+    @classmethod
+    def from_suite(cls, prog, data, k, i):
+        """
+        Executes each valuation of data once, filling the matrix for TA, TD, k-TC, i-TB, TDef, TU, DU and TC
+        """
+        data = list(data)
+        full_coverage = FullCoverage(data, k, i)
+        cfg = get_cfg(prog)
+        obligations = [test.numbered_obligations(cfg) for test in full_coverage.tests]
+        offsets = [0]
+        for test_obligations in obligations:
+            offsets.append(offsets[-1] + len(test_obligations))
+        columns = [str(item) for test_obligations in obligations for item in test_obligations.items]
+        indptr = [0]
+        indices = []
+        for trace in full_coverage.traces(prog, cfg):
+            for c, test in enumerate(full_coverage.tests):
+                mask = test.covered_mask(cfg, trace, obligations[c])
+                indices.extend(offsets[c] + n for n in obligations[c].numbers(mask))
+            indptr.append(len(indices))
+        return cls(fingerprint(prog), suite_hash(data), k, i, [test.name for test in full_coverage.tests], offsets,
+                   columns, np.array(indptr, dtype=np.int64), np.array(indices, dtype=np.int64))
+
+    @staticmethod
+    def file_name(directory, fingerprint, suite_hash, k, i):
+        return os.path.join(directory, f"{fingerprint}_{suite_hash}_{k}-TC_{i}-TB.npz")
+
+    @property
+    def rows(self):
+        return len(self.indptr) - 1
+
+    def save(self, directory):
+        """
+        Saves the matrix in directory, returning the name of the file
+        """
+        name = self.file_name(directory, self.fingerprint, self.suite_hash, self.k, self.i)
+        np.savez_compressed(name, indptr=self.indptr, indices=self.indices, k=self.k, i=self.i,
+                            criteria=np.array(self.criteria, dtype=str), offsets=np.array(self.offsets),
+                            columns=np.array(self.columns, dtype=str))
+        return name
+
+    @classmethod
+    def load(cls, directory, fingerprint, suite_hash, k, i):
+        """
+        Loads the matrix saved in directory for a program fingerprint, a suite hash and the parameters k and i, None if
+        there is none
+        """
+        name = cls.file_name(directory, fingerprint, suite_hash, k, i)
+        if not os.path.exists(name):
+            return None
+        with np.load(name) as saved:
+            if int(saved['k']) != k or int(saved['i']) != i:
+                return None
+            return cls(fingerprint, suite_hash, k, i, saved['criteria'].tolist(), saved['offsets'].tolist(),
+                       saved['columns'].tolist(), saved['indptr'], saved['indices'])
+
+    def criterion_columns(self, criterion):
+        """
+        Returns the slice of the columns of a criterion
+        """
+        c = self.criteria.index(criterion)
+        return slice(self.offsets[c], self.offsets[c + 1])
+
+    def row_columns(self, row):
+        """
+        Returns the array of the columns covered by a row
+        """
+        return self.indices[self.indptr[row]:self.indptr[row + 1]]
+
+    def covering(self, criterion, item):
+        """
+        Returns the rows covering an obligation of a criterion, the obligation being given as an item of the criterion
+        (label for TA, (u, v) pair for TD and TU, ...) or as its description
+        """
+        columns = self.criterion_columns(criterion)
+        column = columns.start + self.columns[columns].index(str(item))
+        # Row of each stored column
+        positions = np.flatnonzero(self.indices == column)
+        return (np.searchsorted(self.indptr, positions, side='right') - 1).tolist()
+
+    def covered(self, criterion, rows=None):
+        """
+        Returns the boolean array of the obligations of a criterion covered by rows, by the whole suite if None
+        """
+        columns = self.criterion_columns(criterion)
+        if rows is None:
+            indices = self.indices
+        else:
+            indices = np.concatenate([self.row_columns(row) for row in rows] + [np.zeros(0, dtype=np.int64)])
+        indices = indices[(indices >= columns.start) & (indices < columns.stop)]
+        covered = np.zeros(columns.stop - columns.start, dtype=bool)
+        covered[indices - columns.start] = True
+        return covered
+
+    def coverage(self, criterion, rows=None):
+        """
+        Returns the percentage of the obligations of a criterion covered by rows, as runTests would
+        """
+        covered = self.covered(criterion, rows)
+        return 100 * int(covered.sum()) / len(covered)
+
+    def masks(self, criterion):
+        """
+        Returns for each row the bitset of the obligations of a criterion it covers, bit n standing for obligation n
+        """
+        columns = self.criterion_columns(criterion)
+        masks = []
+        for row in range(self.rows):
+            mask = 0
+            for column in self.row_columns(row).tolist():
+                if columns.start <= column < columns.stop:
+                    mask |= 1 << (column - columns.start)
+            masks.append(mask)
+        return masks
+
+    def minimize(self, criterion):
+        """
+        Greedily picks the row covering the most new obligations of a criterion, the first one in case of a tie, until
+        the coverage of the whole suite is reached
+        :return: list of the rows picked
+        """
+        return greedy_cover(self.masks(criterion))
+
+    def diff(self, other):
+        """
+        Compares the obligations covered by the suite with those covered by another matrix, such as an older run
+        Obligations are matched by their description.
+        :return: dictionary giving for each criterion of both the descriptions of the obligations covered only by self
+        and only by other
+        """
+        differences = {}
+        for criterion in self.criteria:
+            if criterion in other.criteria:
+                mine = {d for d, c in zip(self.columns[self.criterion_columns(criterion)], self.covered(criterion)) if c}
+                theirs = {d for d, c in zip(other.columns[other.criterion_columns(criterion)], other.covered(criterion))
+                          if c}
+                differences[criterion] = (sorted(mine - theirs), sorted(theirs - mine))
+        return differences
+
+
+def coverage_matrix(prog, data, k, i, directory=None):
+    """
+    Returns the CoverageMatrix of data for prog, loaded from directory if it was saved there before, otherwise built
+    and saved there
+    """
+    data = list(data)
+    if directory is not None:
+        matrix = CoverageMatrix.load(directory, fingerprint(prog), suite_hash(data), k, i)
+        if matrix is not None:
+            return matrix
+    matrix = CoverageMatrix.from_suite(prog, data, k, i)
+    if directory is not None:
+        matrix.save(directory)
+    return matrix
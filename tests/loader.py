@@ -0,0 +1,45 @@
+import csv
+import json
+import os
+from tests.tests import chunked
+
+
+def iter_jsonl(file_name):
+    """
+    Yields the valuations of a JSONL file, one JSON object per line, blank lines being skipped
+    """
+    with open(file_name) as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_csv(file_name):
+    """
+    Yields the valuations of a CSV file whose header gives the variables, empty cells leaving the variable undefined
+    """
+    with open(file_name, newline='') as file:
+        for row in csv.DictReader(file):
+            yield {name: int(value) for name, value in row.items() if value != ''}
+
+
+def load_valuations(file_name):
+    """
+    Streams the valuations of a JSONL (.jsonl, .json) or CSV (.csv) file, reading it as they are consumed so that the
+    whole suite never is in memory
+    :param file_name:
+    :return: iterator over the valuations
+    """
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension in ('.jsonl', '.json'):
+        return iter_jsonl(file_name)
+    if extension == '.csv':
+        return iter_csv(file_name)
+    raise ValueError(f"Unknown valuation file format: {file_name}")
+
+
+def load_chunks(file_name, size=1000):
+    """
+    Streams the valuations of a JSONL or CSV file by lists of size valuations
+    """
+    return chunked(load_valuations(file_name), size)
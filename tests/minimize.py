@@ -0,0 +1,96 @@
+import heapq
+
+
+def popcount(mask):
+    return bin(mask).count('1')
+
+
+def greedy_cover(masks, universe=None):
+    """
+    Greedy set cover: repeatedly picks the set covering the most obligations not covered yet, the first one in case of
+    a tie, until universe is covered
+    Gains only decrease as sets are picked, so they are kept in a priority queue and only recomputed for the set on
+    top of it (lazy greedy).
+    :param masks: bitset of the obligations covered by each set
+    :param universe: bitset of the obligations to cover, all those covered by some set if None
+    :return: list of the numbers of the sets picked, in order
+    """
+    if universe is None:
+        universe = 0
+        for mask in masks:
+            universe |= mask
+    heap = [(-popcount(mask & universe), j) for j, mask in enumerate(masks) if mask & universe]
+    heapq.heapify(heap)
+    covered = 0
+    picked = []
+    while heap and universe & ~covered:
+        bound, j = heapq.heappop(heap)
+        gain = popcount(masks[j] & universe & ~covered)
+        if gain == -bound:
+            # No other set can do better, and those doing as well come after j
+            picked.append(j)
+            covered |= masks[j]
+        elif gain > 0:
+            heapq.heappush(heap, (-gain, j))
+    return picked
+
+
+def exact_cover(masks, universe=None):
+    """
+    Smallest set cover, found by branch and bound
+    Branches on the uncovered obligation covered by the fewest sets, trying each of them. A branch is cut when even
+    sets covering as many obligations as the best remaining one could not beat the best cover found, starting with the
+    greedy one. Exponential in the worst case: meant for small suites.
+    :param masks: bitset of the obligations covered by each set
+    :param universe: bitset of the obligations to cover, all those covered by some set if None
+    :return: list of the numbers of the sets picked, in increasing order
+    """
+    if universe is None:
+        universe = 0
+        for mask in masks:
+            universe |= mask
+    # Sets covering the same obligations are interchangeable, the first one is kept
+    distinct = {}
+    for j, mask in enumerate(masks):
+        if mask & universe:
+            distinct.setdefault(mask & universe, j)
+    candidates = [(mask, j) for mask, j in distinct.items()]
+    best = greedy_cover(masks, universe)
+    chosen = []
+
+    def search(covered):
+        nonlocal best
+        uncovered = universe & ~covered
+        if not uncovered:
+            if len(chosen) < len(best):
+                best = list(chosen)
+            return
+        gains = [popcount(mask & uncovered) for mask, j in candidates]
+        max_gain = max(gains)
+        if len(chosen) + -(-popcount(uncovered) // max_gain) >= len(best):
+            return
+        # Obligation covered by the fewest sets
+        branch = None
+        bits = uncovered
+        while bits:
+            bit = bits & -bits
+            bits ^= bit
+            covering = [(gain, j, mask) for (mask, j), gain in zip(candidates, gains) if mask & bit]
+            if branch is None or len(covering) < len(branch):
+                branch = covering
+        for gain, j, mask in sorted(branch, key=lambda c: (-c[0], c[1])):
+            chosen.append(j)
+            search(covered | mask)
+            chosen.pop()
+
+    search(0)
+    return sorted(best)
+
+
+def minimize(masks, universe=None, exact=False):
+    """
+    Returns the numbers of sets covering universe, found by exact_cover if exact, by greedy_cover otherwise
+    """
+    if exact:
+        return exact_cover(masks, universe)
+    return greedy_cover(masks, universe)
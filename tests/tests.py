@@ -1,240 +1,546 @@
-from collections import Counter
+from abc import ABC, abstractmethod
+from collections import Counter, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import copy
+import itertools
+import pickle
 from model.arithmexpr import *
 from model.booleanexpr import *
 from model.command import *
 from model.cfg import *
+from model.compiler import *
+from model.cache import *
+from model.automaton import *
 
 import networkx as nx
 
 
-class Test(object):
+# Execution of one valuation: path of labels followed, as a tuple, and list of (label, condition, value) taken by the
+# conditions of the decisions reached, as returned by execution_trace
+Trace = namedtuple('Trace', ['path', 'conditions'])
+
+
+def intern(item):
+    """
+    Returns the hashable form of a coverage item, paths being turned into tuples
+    """
+    return tuple(item) if isinstance(item, list) else item
+
+
+class Obligations(object):
+    """
+    Items a criterion asks to cover, numbered once per program
+    Sets of items are int bitsets, bit n standing for items[n]. Items are looked up by their interned form.
+    """
+    __slots__ = ('items', 'index')
+
+    def __init__(self, items):
+        self.items = items
+        self.index = {}
+        for n, item in enumerate(items):
+            self.index.setdefault(intern(item), n)
+
+    def __len__(self):
+        return len(self.items)
+
+    def mask(self, items):
+        """
+        Returns the bitset of the obligations among items, ignoring the others
+        """
+        index = self.index
+        mask = 0
+        for item in items:
+            n = index.get(intern(item))
+            if n is not None:
+                mask |= 1 << n
+        return mask
+
+    def bits(self, numbers):
+        """
+        Returns the bitset of the obligations numbered by numbers
+        """
+        mask = 0
+        for n in numbers:
+            mask |= 1 << n
+        return mask
+
+    def count(self, mask):
+        """
+        Returns the number of obligations in a bitset
+        """
+        return bin(mask).count('1')
+
+    def numbers(self, mask):
+        """
+        Returns the numbers of the obligations in a bitset, in increasing order
+        """
+        numbers = []
+        while mask:
+            low = mask & -mask
+            numbers.append(low.bit_length() - 1)
+            mask ^= low
+        return numbers
+
+    def missing(self, mask):
+        """
+        Returns the obligations not in a bitset, in order
+        """
+        return [item for item in self.items if not mask >> self.index[intern(item)] & 1]
+
+
+class Test(ABC):
+    """
+    Coverage criterion, measured over data, any iterable over valuations
+    data is iterated once by runTests, so that valuations may be streamed (see tests.loader).
+    """
+    # Name of the criterion in reports
+    name = ""
+    # Printed for each item left uncovered
+    missing_message = "{} not covered."
+    # Whether covered needs the values taken by the conditions, and not only the path
+    needs_conditions = False
+    # Number of worker processes executing the data, which is executed in the current process if None
+    workers = None
+    # Number of valuations sent at once to a worker
+    chunk_size = 1000
+
     def __init__(self, data):
         self.data = data
         self.print_missing = False
 
+    @abstractmethod
+    def obligations(self, cfg):
+        """
+        Returns the list of items the criterion asks to cover
+        """
+
+    @abstractmethod
+    def covered(self, cfg, trace):
+        """
+        Returns the items covered by an execution, some of them possibly not being obligations
+        :param cfg:
+        :param trace: Trace of the execution
+        :return:
+        """
+
+    def cache_key(self, what):
+        """
+        Returns the key under which what is kept for this criterion in the graph attributes
+        """
+        return what, type(self).__name__, self.name
+
+    def numbered_obligations(self, cfg):
+        """
+        Returns the Obligations of the criterion, built once and kept in the graph attributes
+        """
+        key = self.cache_key('obligations')
+        if key not in cfg.graph:
+            cfg.graph[key] = Obligations(self.obligations(cfg))
+        return cfg.graph[key]
+
+    def path_automaton(self, cfg):
+        """
+        Returns the PathAutomaton of the obligations, which must be paths, built once and kept in the graph attributes
+        Path number n of the automaton is obligation n.
+        """
+        key = self.cache_key('automaton')
+        if key not in cfg.graph:
+            cfg.graph[key] = PathAutomaton(self.numbered_obligations(cfg).items)
+        return cfg.graph[key]
+
+    def covered_mask(self, cfg, trace, obligations):
+        """
+        Returns the bitset of the obligations covered by an execution
+        """
+        return obligations.mask(self.covered(cfg, trace))
+
+    def trace(self, prog, cfg, value):
+        """
+        Executes one valuation, returning its Trace
+        """
+        if self.needs_conditions:
+            path, conditions_values = execution_trace(cfg, value, get_all_conditions(cfg))
+            return Trace(tuple(path), conditions_values)
+        return Trace(tuple(compile_prog(prog)(value)), [])
+
+    def traces(self, prog, cfg):
+        """
+        Executes each valuation of the data once, yielding its Trace
+        """
+        if self.needs_conditions:
+            conditions = get_all_conditions(cfg)
+            for value in self.data:
+                path, conditions_values = execution_trace(cfg, value, conditions)
+                yield Trace(tuple(path), conditions_values)
+        else:
+            run = compile_prog(prog)
+            for value in self.data:
+                yield Trace(tuple(run(value)), [])
+
+    def coverage(self, obligations, covered):
+        """
+        Returns the percentage of obligations in the bitset covered, printing the missing ones if asked to
+        """
+        percent_coverage = 100 * obligations.count(covered) / len(obligations)
+        if self.print_missing:
+            for item in obligations.missing(covered):
+                print(self.missing_message.format(item))
+        return percent_coverage
+
+    def runTests(self, prog):
+        cfg = get_cfg(prog)
+        obligations = self.numbered_obligations(cfg)
+        if self.workers:
+            covered = parallel_masks(cfg, [self], self.data, self.workers, self.chunk_size)[0]
+        else:
+            covered = 0
+            for trace in self.traces(prog, cfg):
+                covered |= self.covered_mask(cfg, trace, obligations)
+        return self.coverage(obligations, covered)
+
 
 class TestTA(Test):
+    name = "TA"
+    missing_message = "Assignment {} not covered."
+
     def __init__(self, data):
         super().__init__(data)
 
-    def runTests(self, prog):
-        cfg = ast_to_cfg_with_end(prog)
+    def obligations(self, cfg):
         assignments = []
-        covered_assignments = []
         for u, v in cfg.edges:
             if cfg[u][v]['command'].typename == "Assign":
                 assignments.append(cfg[u][v]['command'].label)
+        return assignments
 
-        for value in self.data:
-            path = execution_path(cfg, value)
-            for a in assignments:
-                if a in path:
-                    #print(f"{value} covers assignment {a}")
-                    if a not in covered_assignments:
-                        covered_assignments.append(a)
-
-        percent_coverage = 100*len(covered_assignments)/len(assignments)
-        if self.print_missing:
-            for assignment in assignments:
-                if assignment not in covered_assignments:
-                    print(f"Assignment {assignment} not covered.")
-        return percent_coverage
+    def covered(self, cfg, trace):
+        return set(trace.path)
 
 
 class TestTD(Test):
+    name = "TD"
+    missing_message = "Decision {} not covered."
+
     def __init__(self, data):
         super().__init__(data)
 
-    def runTests(self, prog):
-        cfg = ast_to_cfg_with_end(prog)
-
+    def obligations(self, cfg):
         decisions = []
-        covered_decisions = []
-
         for u in cfg.nodes:
             # decisions are branches
             if len(list(nx.neighbors(cfg, u))) == 2:
                 for v in nx.neighbors(cfg, u):
-                    decisions.append((u,v))
-
-        for value in self.data:
-            path = execution_path(cfg, value)
-            path_edges = [(path[i], path[i+1]) for i in range(len(path)-1)]
-            for d in decisions:
-                if d in path_edges:
-                    #print(f"{value} covers decision {d}")
-                    if d not in covered_decisions:
-                        covered_decisions.append(d)
-
-        percent_coverage = 100*len(covered_decisions)/len(decisions)
-        if self.print_missing:
-            for decision in decisions:
-                if decision not in covered_decisions:
-                    print(f"Decision {decision} not covered.")
-        return percent_coverage
+                    decisions.append((u, v))
+        return decisions
+
+    def covered(self, cfg, trace):
+        path = trace.path
+        return set(zip(path, path[1:]))
 
 
 class TestkTC(Test):
+    missing_message = "Path {} not covered."
+
     def __init__(self, data, k):
         super().__init__(data)
         self.k = k
+        self.name = f"{k}-TC"
 
-    def runTests(self, prog):
-        cfg = ast_to_cfg_with_end(prog)
-
-        k_paths = get_paths(cfg, self.k)
-        covered_k_paths = []
+    def obligations(self, cfg):
+        return get_paths(cfg, self.k)
 
-        for value in self.data:
-            path = execution_path(cfg, value)
-            if path in k_paths:
-                #print(f"{value} covers {self.k}-path {path}")
-                if path not in covered_k_paths:
-                    covered_k_paths.append(path)
+    def covered(self, cfg, trace):
+        return [trace.path]
 
-        percent_coverage = 100*len(covered_k_paths)/len(k_paths)
-        if self.print_missing:
-            for path in k_paths:
-                if path not in covered_k_paths:
-                    print(f"Path {path} not covered.")
-        return percent_coverage
+    def covered_mask(self, cfg, trace, obligations):
+        return obligations.bits(self.path_automaton(cfg).match(trace.path))
 
 
 class TestiTB(Test):
+    missing_message = "Path {} not covered."
+
     def __init__(self, data, i):
         super().__init__(data)
         self.i = i
+        self.name = f"{i}-TB"
 
-    def runTests(self, prog):
-        cfg = ast_to_cfg_with_end(prog)
+    def obligations(self, cfg):
+        return get_paths_with_limited_loop(cfg, self.i)
 
-        i_loops = get_paths_with_limited_loop(cfg, self.i)
-        covered_i_loops = []
+    def covered(self, cfg, trace):
+        return [trace.path]
 
-        for value in self.data:
-            path = execution_path(cfg, value)
-            if path in i_loops:
-                #print(f"{value} covers {self.i}-loops {path}")
-                if path not in covered_i_loops:
-                    covered_i_loops.append(path)
-
-        percent_coverage = 100*len(covered_i_loops)/len(i_loops)
-        if self.print_missing:
-            for path in i_loops:
-                if path not in covered_i_loops:
-                    print(f"Path {path} not covered.")
-        return percent_coverage
+    def covered_mask(self, cfg, trace, obligations):
+        return obligations.bits(self.path_automaton(cfg).match(trace.path))
 
 
 class TestTDef(Test):
+    name = "TDef"
+    missing_message = "Definition {} not covered."
+
     def __init__(self, data):
         super().__init__(data)
 
-    def runTests(self, prog):
-        cfg = ast_to_cfg_with_end(prog)
+    def obligations(self, cfg):
+        return list(get_assigns(cfg))
 
-        definitions = get_assigns(cfg)
-        covered_definitions = []
-
-        for value in self.data:
-            path = execution_path(cfg, value)
-            covered_definitions_in_path = get_assigns_with_next_reference(cfg, path)
-            for a in covered_definitions_in_path:
-                #print(f"{value} covers definition {a}")
-                if a not in covered_definitions:
-                    covered_definitions.append(a)
-
-        percent_coverage = 100 * len(covered_definitions) / len(definitions)
-        if self.print_missing:
-            for definition in definitions:
-                if definition not in covered_definitions:
-                    print(f"Definition {definition} not covered.")
-        return percent_coverage
+    def covered(self, cfg, trace):
+        return get_assigns_with_next_reference(cfg, trace.path)
 
 
 class TestTU(Test):
+    name = "TU"
+    missing_message = "Pair Def-Ref {} not covered."
+
     def __init__(self, data):
         super().__init__(data)
 
-    def runTests(self, prog):
-        cfg = ast_to_cfg_with_end(prog)
-        variables = get_var(cfg)
+    def obligations(self, cfg):
         pairs = set()
+        for variable in get_var(cfg):
+            pairs.update(all_uses(cfg, variable))
+        return list(pairs)
+
+    def covered(self, cfg, trace):
         covered_pairs = set()
-        au = defaultdict(set)
-        for variable in variables:
-            au[variable].update(all_uses(cfg, variable))
-            pairs.update(au[variable])
-        for value in self.data:
-            path = execution_path(cfg, value)
-            for variable in variables:
-                for (u, v) in au[variable]:
-                    for sp in sub_paths(path, u, v):
+        for variable, pairs in def_use_pairs(cfg).items():
+            for (u, v) in pairs:
+                if (u, v) not in covered_pairs:
+                    for sp in sub_paths(trace.path, u, v):
                         if check_no_assign_sub_path(cfg, sp, variable):
-                            covered_pairs.update([(u, v)])
-                            #print(f"Subpath {sp} covers use {u,v}")
-        percent_coverage = 100 * len(covered_pairs) / len(pairs)
-        if self.print_missing:
-            for pair in pairs:
-                if pair not in covered_pairs:
-                    print(f"Pair Def-Ref {pair} not covered.")
-        return percent_coverage
+                            covered_pairs.add((u, v))
+                            break
+        return covered_pairs
 
 
 class TestDU(Test):
+    name = "DU"
+    missing_message = "Simple path {} not covered."
+
     def __init__(self, data):
         super().__init__(data)
 
-    def runTests(self, prog):
-        cfg = ast_to_cfg_with_end(prog)
-        variables = get_var(cfg)
-        simple_path_pairs = {}
+    def obligations(self, cfg):
         simple_paths = []
-        for variable in variables:
-            simple_path_pairs[variable] = all_uses(cfg, variable)
-            for (u, v) in simple_path_pairs[variable]:
+        for variable in get_var(cfg):
+            for (u, v) in all_uses(cfg, variable):
                 for path in get_paths_with_limited_loop(cfg, 1, u, v):
                     if path not in simple_paths and check_no_assign_sub_path(cfg, path, variable):
                         simple_paths.append(path)
-        covered_simple_paths = []
-        for value in self.data:
-            path = execution_path(cfg, value)
-            for variable in variables:
-                for (u, v) in simple_path_pairs[variable]:
-                    for sp in sub_paths(path, u, v):
-                        if sp in simple_paths:
-                            #print(f"Subpath {sp} is covered")
-                            if sp not in covered_simple_paths:
-                                covered_simple_paths.append(sp)
-        percent_coverage = 100 * len(covered_simple_paths) / len(simple_paths)
-        if self.print_missing:
-            for path in simple_paths:
-                if path not in covered_simple_paths:
-                    print(f"Simple path {path} not covered.")
-        return percent_coverage
+        return simple_paths
+
+    def covered(self, cfg, trace):
+        simple_paths = self.numbered_obligations(cfg).items
+        return [simple_paths[n] for n in self.path_automaton(cfg).search(trace.path)]
+
+    def covered_mask(self, cfg, trace, obligations):
+        # Simple paths start and end with a def-use pair, so they are exactly the sub paths of the trace to look for
+        return obligations.bits(self.path_automaton(cfg).search(trace.path))
 
 
 class TestTC(Test):
+    name = "TC"
+    missing_message = "Condition {} not covered."
+    needs_conditions = True
+
     def __init__(self, data):
         super().__init__(data)
 
-    def runTests(self, prog):
-        cfg = ast_to_cfg_with_end(prog)
+    def obligations(self, cfg):
         conditions = get_all_conditions(cfg)
-        all_conditions = [(label, cond_expr, value) for label in conditions for cond_expr in conditions[label] for value in [True, False]]
-        covered_conditions = []
-        for value in self.data:
-            for cond in get_conditions_values(cfg, value, conditions):
-                #print(f"Condition {cond[1]} is evaluated to {cond[2]} at label {cond[0]}")
-                if cond not in covered_conditions and cond in all_conditions:
-                    covered_conditions.append(cond)
-
-        percent_coverage = 100 * len(covered_conditions) / len(all_conditions)
-        if self.print_missing:
-            for condition in all_conditions:
-                if condition not in covered_conditions:
-                    print(f"Condition {condition} not covered.")
-        return percent_coverage
+        return [(label, cond_expr, value) for label in conditions for cond_expr in conditions[label] for value in [True, False]]
+
+    def covered(self, cfg, trace):
+        return trace.conditions
+
+
+class IncrementalCoverage(object):
+    """
+    Coverage of a suite of valuations for one criterion, updated one valuation at a time
+    The bitset of the obligations covered by a valuation is computed once, by executing it, and cached: adding,
+    removing or evaluating a valuation afterwards only costs bitset operations. Valuations are compared by value.
+    """
+    def __init__(self, test, prog):
+        self.test = test
+        self.prog = prog
+        self.cfg = get_cfg(prog)
+        self.obligations = test.numbered_obligations(self.cfg)
+        self.masks = {}
+        self.suite = []
+        self.covered = 0
+
+    def key(self, valuation):
+        return tuple(sorted(valuation.items()))
+
+    def mask(self, valuation):
+        """
+        Returns the bitset of the obligations covered by valuation
+        """
+        key = self.key(valuation)
+        if key not in self.masks:
+            trace = self.test.trace(self.prog, self.cfg, valuation)
+            self.masks[key] = self.test.covered_mask(self.cfg, trace, self.obligations)
+        return self.masks[key]
+
+    def add(self, valuation):
+        """
+        Adds valuation to the suite
+        """
+        mask = self.mask(valuation)
+        self.suite.append(self.key(valuation))
+        self.covered |= mask
+
+    def remove(self, valuation):
+        """
+        Removes one occurrence of valuation from the suite
+        """
+        self.suite.remove(self.key(valuation))
+        self.covered = 0
+        for key in self.suite:
+            self.covered |= self.masks[key]
+
+    def clear(self):
+        """
+        Empties the suite, keeping the cached bitsets
+        """
+        self.suite = []
+        self.covered = 0
+
+    def marginal_gain(self, valuation):
+        """
+        Returns the number of obligations valuation would cover on top of the suite
+        """
+        return self.obligations.count(self.mask(valuation) & ~self.covered)
+
+    def score(self):
+        """
+        Returns the percentage of obligations covered by the suite, as runTests would
+        """
+        return 100 * self.obligations.count(self.covered) / len(self.obligations)
+
+
+def chunked(data, size):
+    """
+    Splits an iterable into lists of size items, the last one possibly shorter
+    """
+    data = iter(data)
+    chunk = list(itertools.islice(data, size))
+    while chunk:
+        yield chunk
+        chunk = list(itertools.islice(data, size))
+
+
+# State of a coverage worker process, set once when it starts by _init_worker
+_worker = {}
+
+
+def _init_worker(payload):
+    compact, tests, obligations = pickle.loads(payload)
+    cfg = compact.to_digraph()
+    cfg.graph['compact'] = compact
+    for test, test_obligations in zip(tests, obligations):
+        cfg.graph[test.cache_key('obligations')] = test_obligations
+    _worker['cfg'] = cfg
+    _worker['tests'] = tests
+    _worker['obligations'] = obligations
+    _worker['conditions'] = get_all_conditions(cfg) if any(test.needs_conditions for test in tests) else {}
+
+
+def _chunk_masks(chunk):
+    cfg, tests, obligations = _worker['cfg'], _worker['tests'], _worker['obligations']
+    masks = [0] * len(tests)
+    for value in chunk:
+        path, conditions_values = execution_trace(cfg, value, _worker['conditions'])
+        trace = Trace(tuple(path), conditions_values)
+        for j, test in enumerate(tests):
+            masks[j] |= test.covered_mask(cfg, trace, obligations[j])
+    return masks
+
+
+def parallel_masks(cfg, tests, data, workers, chunk_size=1000):
+    """
+    Executes data in a pool of worker processes, returning for each test the bitset of its obligations covered
+    The compact cfg, the tests and their obligations are pickled together once and loaded by each worker when it starts,
+    so that conditions in obligations still are those of the graph. Valuations are read from data by chunks of
+    chunk_size, at most two chunks per worker being submitted at a time, and the bitsets of the chunks are merged as
+    they come back.
+    :param cfg:
+    :param tests: criteria to compute, their data being ignored
+    :param data: iterable over the valuations to execute, consumed once
+    :param workers: number of worker processes
+    :param chunk_size:
+    :return:
+    """
+    obligations = [test.numbered_obligations(cfg) for test in tests]
+    stripped_tests = []
+    for test in tests:
+        test = copy.copy(test)
+        test.data = []
+        stripped_tests.append(test)
+    payload = pickle.dumps((compact_cfg(cfg), stripped_tests, obligations))
+    masks = [0] * len(tests)
+
+    def merge(futures):
+        for future in futures:
+            for j, mask in enumerate(future.result()):
+                masks[j] |= mask
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(payload,)) as executor:
+        pending = set()
+        for chunk in chunked(data, chunk_size):
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                merge(done)
+            pending.add(executor.submit(_chunk_masks, chunk))
+        merge(wait(pending)[0])
+    return masks
+
+
+class FullCoverage(Test):
+    """
+    Runs TA, TD, k-TC, i-TB, TDef, TU, DU and TC on the same data, executing each valuation once: the criteria share
+    the trace of every execution.
+    """
+    needs_conditions = True
+
+    def __init__(self, data, k, i):
+        super().__init__(data)
+        self.tests = [TestTA(data), TestTD(data), TestkTC(data, k), TestiTB(data, i), TestTDef(data), TestTU(data),
+                      TestDU(data), TestTC(data)]
+
+    def obligations(self, cfg):
+        """
+        Returns the obligations of all the criteria, as (name of the criterion, item) pairs
+        """
+        return [(test.name, intern(item)) for test in self.tests for item in test.obligations(cfg)]
+
+    def covered(self, cfg, trace):
+        return {(test.name, intern(item)) for test in self.tests for item in test.covered(cfg, trace)}
+
+    def runTests(self, prog):
+        """
+        If print_missing is set, prints for each criterion its missing items and its coverage
+        :param prog:
+        :return: dictionary giving the coverage of each criterion, by name
+        """
+        cfg = get_cfg(prog)
+        obligations = [test.numbered_obligations(cfg) for test in self.tests]
+        if self.workers:
+            covered = parallel_masks(cfg, self.tests, self.data, self.workers, self.chunk_size)
+        else:
+            covered = [0] * len(self.tests)
+            for trace in self.traces(prog, cfg):
+                for j, test in enumerate(self.tests):
+                    covered[j] |= test.covered_mask(cfg, trace, obligations[j])
+        report = {}
+        for test, test_obligations, test_covered in zip(self.tests, obligations, covered):
+            test.print_missing = self.print_missing
+            if self.print_missing:
+                print(f"Test {test.name}")
+            report[test.name] = test.coverage(test_obligations, test_covered)
+            if self.print_missing:
+                print(f"Coverage of {int(report[test.name]*100)/100}%")
+        return report
 
 
 if __name__ == '__main__':
@@ -276,3 +582,6 @@ if __name__ == '__main__':
 
     #testTC = TestTC(values)
     #testTC.runTests(ast)
+
+    #fullCoverage = FullCoverage(values, 6, 1)
+    #print(fullCoverage.runTests(ast))